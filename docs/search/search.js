@@ -0,0 +1,125 @@
+// Client-side full-text search over the index written by script/search.py.
+// Only documents.json and the shards of the query's characters are fetched,
+// plus their delta shards for articles indexed again since the last full build.
+(function () {
+  var base = document.currentScript.src.replace(/[^/]*$/, "");
+  var input = document.getElementById("search-input");
+  var results = document.getElementById("search-results");
+  var wordRe = /[\p{L}\p{N}_]+/gu;
+  var cache = {};
+
+  function load(name) {
+    if (!cache[name]) {
+      cache[name] = fetch(base + name + ".json")
+        .then(function (r) { return r.ok ? r.json() : {}; })
+        .catch(function () { return {}; });
+    }
+    return cache[name];
+  }
+
+  function shardKey(term) {
+    return (term.codePointAt(0) >> 6).toString(16).padStart(4, "0");
+  }
+
+  // Resolves to [main shard, delta shard] of a key; the main postings of
+  // the documents listed in index.delta are stale
+  function loadShards(index, key) {
+    var delta = (index.delta_shards || []).indexOf(key) >= 0 ? load("delta/" + key) : Promise.resolve({});
+    return Promise.all([load(key), delta]);
+  }
+
+  // Postings of one term, from the main and delta shards
+  function postings(index, shards, term) {
+    var stale = new Set(index.delta || []);
+    return (shards[0][term] || []).filter(function (entry) {
+      return !stale.has(entry[0]);
+    }).concat(shards[1][term] || []);
+  }
+
+  // {doc id: Set of positions} of one term
+  function positions(index, shards, term) {
+    var found = {};
+    postings(index, shards, term).forEach(function (entry) {
+      var position = entry[1];
+      var set = new Set([position]);
+      for (var i = 2; i < entry.length; i++) {
+        position += entry[i];
+        set.add(position);
+      }
+      found[entry[0]] = set;
+    });
+    return found;
+  }
+
+  // Resolves to the Set of doc ids containing word as a phrase
+  function matchWord(index, word) {
+    var chars = Array.from(word);
+    if (chars.length === 1) {
+      return loadShards(index, shardKey(word)).then(function (shards) {
+        var docs = new Set();
+        var terms = new Set(Object.keys(shards[0]).concat(Object.keys(shards[1])));
+        terms.forEach(function (term) {
+          if (term.startsWith(word)) {
+            postings(index, shards, term).forEach(function (entry) { docs.add(entry[0]); });
+          }
+        });
+        return docs;
+      });
+    }
+    var grams = [];
+    for (var i = 0; i < chars.length - 1; i++) {
+      grams.push(chars[i] + chars[i + 1]);
+    }
+    return Promise.all(grams.map(function (gram) { return loadShards(index, shardKey(gram)); }))
+      .then(function (shards) {
+        var starts = positions(index, shards[0], grams[0]);
+        for (var i = 1; i < grams.length; i++) {
+          var following = positions(index, shards[i], grams[i]);
+          Object.keys(starts).forEach(function (doc) {
+            var next = following[doc];
+            var kept = new Set();
+            starts[doc].forEach(function (p) {
+              if (next && next.has(p + i)) kept.add(p);
+            });
+            starts[doc] = kept;
+          });
+        }
+        return new Set(Object.keys(starts).filter(function (doc) {
+          return starts[doc].size > 0;
+        }).map(Number));
+      });
+  }
+
+  function render(documents, docs) {
+    results.textContent = "";
+    docs.sort(function (a, b) { return a - b; }).forEach(function (doc) {
+      var li = document.createElement("li");
+      var a = document.createElement("a");
+      a.href = documents[doc][0];
+      a.textContent = documents[doc][1];
+      li.appendChild(a);
+      results.appendChild(li);
+    });
+  }
+
+  var latest = 0;
+  input.addEventListener("input", function () {
+    var words = input.value.normalize("NFKC").toLowerCase().match(wordRe) || [];
+    var request = ++latest;
+    if (!words.length) {
+      results.textContent = "";
+      return;
+    }
+    load("documents").then(function (index) {
+      return Promise.all(words.map(function (word) { return matchWord(index, word); }))
+        .then(function (found) {
+          if (request !== latest) return;
+          var docs = found[0];
+          found.slice(1).forEach(function (set) {
+            docs = new Set(Array.from(docs).filter(function (doc) { return set.has(doc); }));
+          });
+          render(index.documents, Array.from(docs));
+        });
+    });
+  });
+})();
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Asset fingerprinting: content-hashed copies of style.css and images
+Usage: python3 assets.py --docs_dir ../docs [--manifest_file asset_manifest.json]
+"""
+import fnmatch
+import hashlib
+import json
+import os
+import re
+import shutil
+
+from images import is_local_url
+
+
+# Assets under docs/ that get a fingerprinted name
+ASSET_PATTERNS = ("style/style.css", "image/*")
+# Length of the content hash in a fingerprinted name (style.1a2b3c4d.css)
+FINGERPRINT_LENGTH = 8
+
+# The hash part of a fingerprinted name, before the extension
+FINGERPRINT_RE = re.compile(rf'\.[0-9a-f]{{{FINGERPRINT_LENGTH}}}$')
+
+# Local URLs in src/href attributes, rewritten to the fingerprinted names
+ASSET_URL_RE = re.compile(r'\b(src|href)="([^"]+)"')
+
+
+def fingerprinted_name(rel_path, digest):
+    """Return rel_path with the start of digest before its extension"""
+    base, ext = os.path.splitext(rel_path)
+    return f"{base}.{digest[:FINGERPRINT_LENGTH]}{ext}"
+
+
+def original_name(rel_path):
+    """Return rel_path without a fingerprint (style.1a2b3c4d.css -> style.css)"""
+    if FINGERPRINT_RE.search(rel_path):
+        # A file without an extension
+        return FINGERPRINT_RE.sub("", rel_path)
+    base, ext = os.path.splitext(rel_path)
+    return FINGERPRINT_RE.sub("", base) + ext
+
+
+def is_fingerprinted(rel_path, digest):
+    """Tell whether rel_path is a fingerprinted copy, named after the start
+    of its own content hash; such a name needs no record to be recognized"""
+    return rel_path != original_name(rel_path) and \
+        fingerprinted_name(original_name(rel_path), digest) == rel_path
+
+
+def find_assets(docs_dir, patterns=ASSET_PATTERNS):
+    """Return the docs-relative paths of the files matching patterns,
+    and of the fingerprinted copies of such files"""
+    found = []
+    for pattern in patterns:
+        directory = os.path.dirname(pattern)
+        try:
+            names = sorted(os.listdir(os.path.join(docs_dir, directory)))
+        except OSError:
+            continue
+        for name in names:
+            rel_path = f"{directory}/{name}" if directory else name
+            if (fnmatch.fnmatch(original_name(rel_path), pattern)
+                    and os.path.isfile(os.path.join(docs_dir, rel_path))):
+                found.append(rel_path)
+    return found
+
+
+def load_asset_manifest(manifest_file):
+    """Load {path: {sha256, size, mtime_ns}}"""
+    if not manifest_file or not os.path.exists(manifest_file):
+        return {}
+    try:
+        with open(manifest_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data.get("files", {}) if isinstance(data, dict) else {}
+
+
+def save_asset_manifest(manifest_file, files):
+    with open(manifest_file, "w", encoding="utf-8") as f:
+        json.dump({"files": files}, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def _file_entry(path, previous):
+    """Return {sha256, size, mtime_ns} of path, reusing previous on a stat match"""
+    st = os.stat(path)
+    if previous and previous["size"] == st.st_size and previous["mtime_ns"] == st.st_mtime_ns:
+        return previous
+    with open(path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    return {"sha256": digest, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _link_or_copy(source, target):
+    """Hard-link target to source, copying where links are not supported"""
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def fingerprint_assets(docs_dir, manifest_file, patterns=ASSET_PATTERNS):
+    """Write fingerprinted copies of the assets; returns {path: fingerprinted path}.
+    
+    Paths are relative to docs_dir. The manifest only caches hashes: a
+    file whose size and mtime match it is not read again. Copies are told
+    apart from assets by their names: one named after its own hash
+    (is_fingerprinted) or after an asset beside it. So a missing manifest
+    never makes a copy of a copy, and the copies of older contents and of
+    deleted assets are removed.
+    """
+    previous = load_asset_manifest(manifest_file)
+    files = {
+        rel_path: _file_entry(os.path.join(docs_dir, rel_path), previous.get(rel_path))
+        for rel_path in find_assets(docs_dir, patterns)
+    }
+    # A copy edited through its hard link no longer matches its own hash,
+    # but its asset is still there
+    copies = {
+        rel_path for rel_path, entry in files.items()
+        if is_fingerprinted(rel_path, entry["sha256"])
+        or (original_name(rel_path) != rel_path and original_name(rel_path) in files)
+    }
+    
+    assets = {}
+    for rel_path, entry in list(files.items()):
+        if rel_path in copies:
+            continue
+        fingerprinted = fingerprinted_name(rel_path, entry["sha256"])
+        target = os.path.join(docs_dir, fingerprinted)
+        if not os.path.exists(target):
+            _link_or_copy(os.path.join(docs_dir, rel_path), target)
+            # Same content, so the hash is known; a copy may differ in mtime
+            files[fingerprinted] = dict(entry, mtime_ns=os.stat(target).st_mtime_ns)
+        assets[rel_path] = fingerprinted
+    
+    # Remove the copies of older contents and of deleted assets
+    for stale in copies - set(assets.values()):
+        os.remove(os.path.join(docs_dir, stale))
+        del files[stale]
+    
+    save_asset_manifest(manifest_file, files)
+    return assets
+
+
+def asset_paths(docs_dir, fingerprints):
+    """Turn {path: fingerprinted path} into the same mapping of absolute paths"""
+    return {
+        os.path.abspath(os.path.join(docs_dir, rel_path)): os.path.abspath(os.path.join(docs_dir, target))
+        for rel_path, target in fingerprints.items()
+    }
+
+
+def asset_url(url, page_dir, paths):
+    """Return the fingerprinted form of a URL used by a page in page_dir"""
+    if not is_local_url(url):
+        return url
+    target = paths.get(os.path.abspath(os.path.join(page_dir, url)))
+    if target is None:
+        return url
+    return os.path.relpath(target, os.path.abspath(page_dir)).replace(os.sep, "/")
+
+
+def rewrite_asset_urls(text, page_dir, paths):
+    """Rewrite the src/href attributes of text for a page in page_dir"""
+    return ASSET_URL_RE.sub(
+        lambda m: f'{m.group(1)}="{asset_url(m.group(2), page_dir, paths)}"', text
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        description="style.cssと画像に内容のハッシュを含むファイル名のコピーを作成します"
+    )
+    parser.add_argument("--docs_dir", default="../docs", help="対象のディレクトリ")
+    parser.add_argument("--manifest_file", default="asset_manifest.json",
+                        help="ファイルのハッシュを記録するキャッシュ")
+    
+    args = parser.parse_args()
+    for rel_path, target in sorted(fingerprint_assets(args.docs_dir, args.manifest_file).items()):
+        print(f"{rel_path} -> {target}")
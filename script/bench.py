@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Benchmark and profiling suite for the converter and site build
+Usage: python3 bench.py [--articles N] [--article_kb N] [--mix kind=weight,...]
+                        [--save baseline.json] [--compare baseline.json]
+                        [--profile out.prof]
+       python3 bench.py --startup [--startup_budget_ms 50]
+"""
+import compileall
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from convert_md_to_html import (
+    MarkdownConverter,
+    generate_html_template,
+    load_file,
+    update_blog_index_entries,
+)
+
+
+# Relative weight of each block kind; "inline" is the share of inline
+# links/images among the words of a sentence.
+DEFAULT_MIX = {
+    "heading": 1,
+    "paragraph": 3,
+    "list": 2,
+    "code": 1,
+    "quote": 1,
+    "inline": 2,
+}
+
+PLAIN_WORDS = ["markdown", "変換", "テスト", "**太字**", "*斜体*", "`code`", "文章", "です."]
+INLINE_WORDS = ["[リンク](https://example.com/page)", "![画像](../image/sit.jpg)",
+                '![図](../image/pdd1.jpg "キャプション")']
+
+
+def parse_mix(text):
+    """Parse 'list=3,code=1' into a feature mix based on DEFAULT_MIX"""
+    mix = dict(DEFAULT_MIX)
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        kind, _, weight = item.partition("=")
+        if kind not in mix:
+            raise ValueError(f"未知の要素です: {kind}")
+        mix[kind] = float(weight)
+    return mix
+
+
+def generate_markdown(size_bytes, seed=0, mix=None):
+    """Generate a synthetic article of roughly size_bytes bytes (UTF-8)"""
+    mix = mix or DEFAULT_MIX
+    rng = random.Random(seed)
+    kinds = [kind for kind in ("heading", "paragraph", "list", "code", "quote") if mix[kind] > 0]
+    weights = [mix[kind] for kind in kinds]
+    inline_ratio = mix["inline"] / (mix["inline"] + 10)
+    
+    def sentence():
+        return " ".join(
+            rng.choice(INLINE_WORDS) if rng.random() < inline_ratio else rng.choice(PLAIN_WORDS)
+            for _ in range(rng.randint(4, 12))
+        )
+    
+    blocks = [f"# ベンチマーク {seed}"]
+    size = 0
+    while size < size_bytes:
+        kind = rng.choices(kinds, weights)[0]
+        if kind == "heading":
+            block = f"{'#' * rng.randint(2, 3)} {sentence()}"
+        elif kind == "list":
+            # Deeply nested lists: depth wanders up and down one level at a time
+            depth = 0
+            items = []
+            for _ in range(rng.randint(3, 12)):
+                depth = max(0, min(6, depth + rng.choice((-1, 0, 1))))
+                items.append(f"{'  ' * depth}{rng.choice('-*+')} {sentence()}")
+            block = "\n".join(items)
+        elif kind == "code":
+            body = "\n".join(f"    x = {i} < {i + 1}  # **not bold**" for i in range(rng.randint(3, 30)))
+            block = f"```python\n{body}\n```"
+        elif kind == "quote":
+            block = "\n".join(
+                f"{'>' * rng.randint(1, 3)} {sentence()}" for _ in range(rng.randint(3, 20))
+            )
+        else:
+            block = "\n".join(sentence() for _ in range(rng.randint(1, 5)))
+        blocks.append(block)
+        size += len(block.encode("utf-8")) + 2
+    return "\n\n".join(blocks)
+
+
+def generate_corpus(articles, article_bytes, mix=None):
+    """Generate a list of (filename, markdown) pairs"""
+    return [
+        (f"bench_{i:05d}", generate_markdown(article_bytes, seed=i, mix=mix))
+        for i in range(articles)
+    ]
+
+
+def _best_of(repeat, func):
+    """Return the best wall time in seconds of func() over repeat runs"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _peak_memory(func):
+    """Return the tracemalloc peak in bytes while running func()"""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_convert(markdown_text, repeat=5):
+    """Return the best wall time in seconds of converting markdown_text.
+    
+    Every run uses a fresh converter, so the block and inline caches
+    start empty and the conversion itself is measured.
+    """
+    return _best_of(repeat, lambda: MarkdownConverter().convert(markdown_text))
+
+
+def run_stages(corpus, template, repeat=3, large_bytes=0):
+    """Time each build stage over the corpus; returns a dict of results.
+    
+    The conversion stages start every run with a fresh converter, so their
+    caches are empty; convert_warm converts the corpus again with a
+    converter that has already seen it, which is what a rebuild costs.
+    """
+    corpus_bytes = sum(len(text.encode("utf-8")) for _, text in corpus)
+    warm = MarkdownConverter(cache=True)
+    converted = [warm.convert(text) for _, text in corpus]
+    entries = [(f"記事 {name}", f"../docs/blog_html/{name}.html") for name, _ in corpus]
+    
+    def convert_all(converter=None):
+        converter = converter or MarkdownConverter()
+        for _, text in corpus:
+            converter.convert(text)
+    
+    def stream_all():
+        converter = MarkdownConverter()
+        for _, text in corpus:
+            for _ in converter.iter_convert(io.StringIO(text)):
+                pass
+    
+    def template_all():
+        for (name, _), content in zip(corpus, converted):
+            generate_html_template(template, name, content, "2026年01月01日 00:00:00")
+    
+    def index_all():
+        with tempfile.TemporaryDirectory() as tmp:
+            index_path = os.path.join(tmp, "blog_index.html")
+            with open(index_path, "w", encoding="utf-8") as f:
+                f.write("<html><body><ul>\n        </ul></body></html>\n")
+            with contextlib.redirect_stdout(io.StringIO()):
+                update_blog_index_entries(entries, index_path)
+    
+    stages = {
+        "convert": (convert_all, corpus_bytes),
+        "convert_warm": (lambda: convert_all(warm), corpus_bytes),
+        "iter_convert": (stream_all, corpus_bytes),
+        "generate_html_template": (template_all, sum(len(c.encode("utf-8")) for c in converted)),
+        "update_blog_index": (index_all, 0),
+    }
+    if large_bytes:
+        large = generate_markdown(large_bytes, seed=len(corpus))
+        large_size = len(large.encode("utf-8"))
+        stages["convert_large"] = (lambda: MarkdownConverter().convert(large), large_size)
+    
+    results = {}
+    for name, (func, size) in stages.items():
+        seconds = _best_of(repeat, func)
+        results[name] = {
+            "seconds": seconds,
+            "mb_per_s": (size / (1024 * 1024)) / seconds if size and seconds else None,
+            # Measured in a separate run so tracing does not skew the timing
+            "peak_bytes": _peak_memory(func),
+        }
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Print stage ratios against a baseline; returns names of regressions"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get("stages", {}).get(name)
+        if not base or not base.get("seconds"):
+            continue
+        ratio = result["seconds"] / base["seconds"]
+        flag = ""
+        if ratio > threshold:
+            flag = "  <-- 劣化"
+            regressions.append(name)
+        print(f"  {name:24s} {ratio:6.2f}x{flag}")
+    return regressions
+
+
+def import_times(module, cwd=None):
+    """Return [(cumulative us, self us, name)] from python -X importtime"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, check=True, cwd=cwd)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), int(self_us), name.strip()))
+    return rows
+
+
+def startup_check(md_file, template_file, blog_index_file, budget_ms, repeat=5):
+    """Time `convert.py <md_file>` end to end; returns whether it fits budget_ms.
+    
+    The scripts are copied into a temporary tree laid out like the
+    repository, so each run starts a fresh interpreter and docs/ is left
+    untouched.
+    """
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_script = os.path.join(tmp, "script")
+        shutil.copytree(script_dir, tmp_script,
+                        ignore=shutil.ignore_patterns("*.json", "__pycache__"))
+        os.makedirs(os.path.join(tmp, "docs", "blog_html"))
+        os.makedirs(os.path.join(tmp, "blog_md"))
+        shutil.copy(blog_index_file, os.path.join(tmp, "docs", "blog_index.html"))
+        shutil.copy(template_file, os.path.join(tmp_script, "template", "template.html"))
+        shutil.copy(md_file, os.path.join(tmp, "blog_md", "article.md"))
+        # Measure with bytecode cached, as after the first run of a normal setup
+        compileall.compile_dir(tmp_script, quiet=1)
+        
+        cmd = [sys.executable, os.path.join(tmp_script, "convert.py"), "blog_md/article.md"]
+        manifest_file = os.path.join(tmp_script, "build_manifest.json")
+        
+        def run():
+            # Without a manifest entry the article is converted every time
+            if os.path.exists(manifest_file):
+                os.remove(manifest_file)
+            subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, cwd=tmp)
+        
+        command_ms = _best_of(repeat, run) * 1000
+        bare_ms = _best_of(repeat, lambda: subprocess.run([sys.executable, "-c", "pass"],
+                                                           check=True)) * 1000
+        rows = import_times("convert_md_to_html", tmp_script)
+    
+    total_us = next(cumulative for cumulative, _, name in rows if name == "convert_md_to_html")
+    print(f"convert.py（単一記事）: {command_ms:7.1f} ms（インタプリタ起動 {bare_ms:.1f} ms を含む、予算 {budget_ms:.0f} ms）")
+    print(f"convert_md_to_html のimport: {total_us / 1000:7.1f} ms（-X importtime）")
+    for _, self_us, name in sorted(rows, reverse=True, key=lambda row: row[1])[:5]:
+        print(f"  {self_us / 1000:7.1f} ms  {name}")
+    if command_ms > budget_ms:
+        print("起動時間が予算を超えています")
+        return False
+    return True
+
+
+def main(articles, article_kb, mix, repeat, large_mb, template_file,
+         save=None, baseline_file=None, threshold=1.2, profile=None):
+    """Run the benchmark suite; returns False when a regression is found"""
+    template = load_file(template_file)
+    if not template:
+        return False
+    
+    corpus = generate_corpus(articles, int(article_kb * 1024), mix)
+    print(f"コーパス: {articles} 記事 x {article_kb} KB, mix={mix}")
+    
+    if profile:
+        import cProfile
+        
+        profiler = cProfile.Profile()
+        profiler.enable()
+        results = run_stages(corpus, template, repeat, int(large_mb * 1024 * 1024))
+        profiler.disable()
+        profiler.dump_stats(profile)
+        print(f"プロファイルを保存しました: {profile}")
+    else:
+        results = run_stages(corpus, template, repeat, int(large_mb * 1024 * 1024))
+    
+    for name, result in results.items():
+        throughput = f"{result['mb_per_s']:7.2f} MB/s" if result["mb_per_s"] else " " * 12
+        print(f"{name:24s} {result['seconds'] * 1000:9.1f} ms  {throughput}  "
+              f"peak {result['peak_bytes'] / (1024 * 1024):7.2f} MB")
+    
+    report = {
+        "corpus": {"articles": articles, "article_kb": article_kb, "mix": mix,
+                   "large_mb": large_mb},
+        "stages": results,
+    }
+    if save:
+        with open(save, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"ベースラインを保存しました: {save}")
+    
+    if baseline_file:
+        with open(baseline_file, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"ベースライン比較: {baseline_file}")
+        if baseline.get("corpus") != report["corpus"]:
+            print("警告: ベースラインとコーパスの条件が異なります")
+        regressions = compare(results, baseline, threshold)
+        if regressions:
+            print(f"性能劣化を検出しました: {', '.join(regressions)}")
+            return False
+    return True
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        description="コンバータとサイトビルドの各段階の性能を計測します"
+    )
+    parser.add_argument("--articles", type=int, default=100, help="合成コーパスの記事数")
+    parser.add_argument("--article_kb", type=float, default=16, help="1記事あたりのサイズ（KB）")
+    parser.add_argument("--mix", default="",
+                        help="要素の重み（例: list=4,code=2,quote=1,inline=5）")
+    parser.add_argument("--repeat", type=int, default=3, help="各段階の試行回数（最速値を採用）")
+    parser.add_argument("--large_mb", type=float, default=4,
+                        help="単一の大きな記事のサイズ（MB、0で省略）")
+    parser.add_argument("--template_file", default="template/template.html",
+                        help="HTMLテンプレートファイル")
+    parser.add_argument("--save", help="結果をJSONベースラインとして保存")
+    parser.add_argument("--compare", help="比較するJSONベースライン")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="劣化とみなす比率（既定値1.2倍）")
+    parser.add_argument("--profile", help="cProfileの結果を保存するファイル")
+    parser.add_argument("--startup", action="store_true",
+                        help="単一記事の変換にかかる時間（起動時間を含む）だけを計測")
+    parser.add_argument("--startup_budget_ms", type=float, default=50,
+                        help="単一記事の変換の予算（ミリ秒）")
+    parser.add_argument("--md_file", default="../blog_md/gas.md",
+                        help="--startupで変換する記事")
+    parser.add_argument("--blog_index_file", default="../docs/blog_index.html",
+                        help="--startupで複製するブログインデックス")
+    
+    args = parser.parse_args()
+    if args.startup:
+        success = startup_check(args.md_file, args.template_file, args.blog_index_file,
+                                args.startup_budget_ms, args.repeat)
+        exit(0 if success else 1)
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    success = main(args.articles, args.article_kb, mix, args.repeat, args.large_mb,
+                   args.template_file, args.save, args.compare, args.threshold, args.profile)
+    exit(0 if success else 1)
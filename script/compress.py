@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Pre-compressed .gz siblings for the text files of the site
+Usage: python3 compress.py --docs_dir ../docs [--cache_file compress_manifest.json]
+"""
+import gzip
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Text artifacts worth serving pre-compressed
+COMPRESS_EXTENSIONS = (".html", ".css", ".js", ".json", ".svg", ".txt", ".xml")
+
+
+def gzip_bytes(data):
+    """Compress deterministically: maximum level, no name and a zero mtime"""
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def find_text_files(docs_dir):
+    """Return every compressible file under docs_dir"""
+    found = []
+    for root, _, files in os.walk(docs_dir):
+        for name in files:
+            if name.endswith(COMPRESS_EXTENSIONS):
+                found.append(os.path.join(root, name))
+    return sorted(found)
+
+
+def load_cache(cache_file):
+    """Load {path: {size, mtime_ns, sha256}} of already compressed files"""
+    if not cache_file or not os.path.exists(cache_file):
+        return {}
+    try:
+        with open(cache_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(cache_file, cache):
+    with open(cache_file, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def _compress_file(path):
+    """Write path.gz; returns (path, original bytes, compressed bytes)"""
+    with open(path, "rb") as f:
+        data = f.read()
+    compressed = gzip_bytes(data)
+    tmp_path = f"{path}.gz.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(compressed)
+    os.replace(tmp_path, f"{path}.gz")
+    return path, len(data), len(compressed)
+
+
+def compress_tree(docs_dir, cache_file=None, workers=None):
+    """Write .gz siblings for changed text files under docs_dir.
+    
+    A file is skipped when its .gz exists and its content hash matches the
+    cache; size and mtime are checked first so unchanged files are not
+    even read. Compression runs in a thread pool (zlib releases the GIL).
+    Returns (compressed count, skipped count).
+    """
+    cache = load_cache(cache_file)
+    files = find_text_files(docs_dir)
+    pending = []
+    skipped = 0
+    new_cache = {}
+    for path in files:
+        key = os.path.relpath(path, docs_dir)
+        st = os.stat(path)
+        entry = cache.get(key)
+        has_gz = os.path.exists(f"{path}.gz")
+        if entry and has_gz and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            new_cache[key] = entry
+            skipped += 1
+            continue
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        new_cache[key] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": digest}
+        if entry and has_gz and entry["sha256"] == digest:
+            skipped += 1
+            continue
+        pending.append(path)
+    
+    saved = 0
+    if pending:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for path, original, compressed in executor.map(_compress_file, pending):
+                saved += original - compressed
+    
+    # Remove the .gz files this tool wrote for sources that are gone; other
+    # .gz files under docs_dir (e.g. archives) are never touched
+    for key in cache.keys() - new_cache.keys():
+        gz_path = os.path.join(docs_dir, f"{key}.gz")
+        if key.endswith(COMPRESS_EXTENSIONS) and os.path.exists(gz_path):
+            os.remove(gz_path)
+    
+    if cache_file:
+        save_cache(cache_file, new_cache)
+    print(f"gzip圧縮: {len(pending)} 件更新, {skipped} 件スキップ（{saved / 1024:.1f} KB削減）")
+    return len(pending), skipped
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        description="docs/以下のテキストファイルに.gzファイルを作成します"
+    )
+    parser.add_argument("--docs_dir", default="../docs", help="対象のディレクトリ")
+    parser.add_argument("--cache_file", default="compress_manifest.json",
+                        help="圧縮済みファイルのハッシュを記録するファイル")
+    parser.add_argument("--workers", type=int, default=None, help="圧縮スレッド数")
+    
+    args = parser.parse_args()
+    compress_tree(args.docs_dir, args.cache_file, args.workers)
@@ -2,71 +2,124 @@
 """
 Simple Markdown to HTML converter wrapper
 Usage: python3 convert.py <markdown_file>
+       python3 convert.py build [--jobs N] [--page_budget_kb N] ...
+       python3 convert.py serve [--watch] [--port N]
 """
 import os
 import sys
-from pathlib import Path
+
+
+# Everything is resolved from this file, so the commands work from any
+# directory. The converter itself runs inside script/, where the paths
+# below are relative to, so the hrefs it records stay the same.
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SCRIPT_DIR)
+
+TEMPLATE_FILE = "template/template.html"
+MD_DIR = "../blog_md"
+DOCS_DIR = "../docs"
+OUTPUT_DIR = "../docs/blog_html"
+BLOG_INDEX_FILE = "../docs/blog_index.html"
+MANIFEST_FILE = "build_manifest.json"
+SEARCH_DIR = "../docs/search"
+
+
+def resolve_md_file(md_file):
+    """Return the absolute path of md_file, given relative to the current
+    directory or to the repository root (e.g. blog_md/my_article.md)"""
+    if os.path.isabs(md_file) or os.path.exists(md_file):
+        return os.path.abspath(md_file)
+    return os.path.join(ROOT_DIR, md_file)
+
+
+def enter_script_dir():
+    """Run from script/ and check the files every command needs"""
+    os.chdir(SCRIPT_DIR)
+    for path in (TEMPLATE_FILE, BLOG_INDEX_FILE):
+        if not os.path.exists(path):
+            print(f"エラー: ファイル '{path}' が見つかりません")
+            sys.exit(1)
+
+
+def build(options):
+    """Rebuild every article under blog_md/ in this process.
+    
+    options are passed on to convert_md_to_html's arguments (e.g. --jobs 4).
+    """
+    enter_script_dir()
+    
+    import convert_md_to_html
+    
+    print(f"一括変換中: {MD_DIR} -> {OUTPUT_DIR}")
+    argv = [
+        "--md_dir", MD_DIR,
+        "--template_file", TEMPLATE_FILE,
+        "--output_dir", OUTPUT_DIR,
+        "--blog_index_file", BLOG_INDEX_FILE,
+        "--manifest_file", MANIFEST_FILE,
+        "--search_dir", SEARCH_DIR,
+        *options
+    ]
+    if not convert_md_to_html.cli(argv):
+        print("エラー: 一括変換に失敗しました")
+        sys.exit(1)
+
+
+def serve_site(args):
+    """Serve docs/ with a warm converter, rebuilding changed pages"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(prog="convert.py serve",
+                                     description="docs/を配信し、変更された記事を自動で再ビルドします")
+    parser.add_argument("--watch", action="store_true", help="変更を監視して自動で再ビルド")
+    parser.add_argument("--port", type=int, default=8000, help="待ち受けポート")
+    parser.add_argument("--interval", type=float, default=0.5, help="監視のポーリング間隔（秒）")
+    options = parser.parse_args(args)
+    
+    enter_script_dir()
+    
+    import serve
+    
+    serve.main(MD_DIR, TEMPLATE_FILE, DOCS_DIR, MANIFEST_FILE,
+               options.port, options.watch, options.interval)
 
 
 def main():
+    if len(sys.argv) >= 2 and sys.argv[1] == "build":
+        build(sys.argv[2:])
+        return
+    
+    if len(sys.argv) >= 2 and sys.argv[1] == "serve":
+        serve_site(sys.argv[2:])
+        return
+    
     if len(sys.argv) != 2:
         print("使用方法: python3 convert.py <markdown_file>")
+        print("        python3 convert.py build [--jobs N] [--page_budget_kb N] ...")
+        print("        python3 convert.py serve [--watch] [--port N]")
         print("例: python3 convert.py blog_md/my_article.md")
         sys.exit(1)
     
-    md_file = sys.argv[1]
+    md_file = resolve_md_file(sys.argv[1])
     
     # Check if markdown file exists
     if not os.path.exists(md_file):
-        print(f"エラー: ファイル '{md_file}' が見つかりません")
+        print(f"エラー: ファイル '{sys.argv[1]}' が見つかりません")
         sys.exit(1)
     
-    # Get file info
-    md_path = Path(md_file)
-    filename = md_path.stem  # filename without extension
+    # filename without extension
+    filename = os.path.splitext(os.path.basename(md_file))[0]
+    output_file = f"{OUTPUT_DIR}/{filename}.html"
     
-    # Set default paths (adjust for script directory)
-    template_file = "template/template.html"
-    output_file = f"../docs/blog_html/{filename}.html"
-    blog_index_file = "../docs/blog_index.html"
+    enter_script_dir()
     
-    # Check if template exists
-    if not os.path.exists(template_file):
-        print(f"エラー: テンプレートファイル '{template_file}' が見つかりません")
-        sys.exit(1)
-    
-    # Check if blog_index exists
-    if not os.path.exists(blog_index_file):
-        print(f"エラー: ブログインデックスファイル '{blog_index_file}' が見つかりません")
-        sys.exit(1)
-    
-    # Run the conversion
-    import subprocess
-    
-    # Adjust md_file path if it's relative to project root
-    if not os.path.isabs(md_file) and not md_file.startswith('../'):
-        md_file = f"../{md_file}"
-    
-    cmd = [
-        "python3", "convert_md_to_html.py",
-        "--md_file", md_file,
-        "--template_file", template_file,
-        "--output_file", output_file,
-        "--blog_index_file", blog_index_file
-    ]
+    # Imported only now so that usage errors return without loading it
+    import convert_md_to_html
     
     print(f"変換中: {md_file} -> {output_file}")
-    
-    try:
-        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
-        print(result.stdout)
-        print(f"変換完了: {output_file}")
-    except subprocess.CalledProcessError as e:
-        print(f"エラー: 変換に失敗しました")
-        print(f"エラー出力: {e.stderr}")
-        sys.exit(1)
-    except FileNotFoundError:
-        print("エラー: python3 または convert_md_to_html.py が見つかりません")
+    if not convert_md_to_html.main(md_file, TEMPLATE_FILE, output_file, BLOG_INDEX_FILE,
+                                   MANIFEST_FILE, search_dir=SEARCH_DIR):
+        print("エラー: 変換に失敗しました")
         sys.exit(1)
 
 
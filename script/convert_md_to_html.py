@@ -4,294 +4,495 @@ Markdown to HTML converter using only standard library
 """
 import re
 import os
-import html
-from datetime import datetime
-from pathlib import Path
+import json
+import time
+import hashlib
+from collections import OrderedDict, namedtuple
+from functools import lru_cache
+
+import instrument
+from images import image_size, is_local_url
+
+
+# Bump whenever the generated HTML for an unchanged source would differ,
+# so the build manifest invalidates every previously built page.
+CONVERTER_VERSION = "3"
+
+
+# Block-level tokens, compiled once and only tried after a cheap prefix check
+BLOCKQUOTE_RE = re.compile(r'^(?P<markers>(?:>\s*)+)(.*)$')
+LIST_ITEM_RE = re.compile(r'^(\s*)([-*+])\s+(.*)$')
+INLINE_FENCE_RE = re.compile(r'```(.*?)```')
+
+# Clean up br tags around lists
+BR_CLEANUP_PATTERNS = [
+    (re.compile(r'<br>\s*<ul>'), '<ul>'),
+    (re.compile(r'</ul>\s*<br>'), '</ul>'),
+    (re.compile(r'<br>\s*<li>'), '<li>'),
+    (re.compile(r'</li>\s*<br>'), '</li>'),
+    (re.compile(r'</li>\s*<ul>'), '<ul>'),
+]
+
+# Lines starting with these are emitted as-is instead of joining a paragraph
+SPECIAL_PREFIXES = (
+    '<h', '<figure>', '</figure>', '<ul>', '<li>', '</ul>', '</li>',
+    '<blockquote>', '</blockquote>',
+)
+
+# Marks a line holding an already rendered fenced code block
+CODE_MARK = '\x00'
+
+# Rendered inline text is cached with the image src and attributes left as
+# IMAGE_MARK + src + IMAGE_MARK, filled in on every lookup, so the cache
+# neither depends on base_dir or fingerprints nor keeps stale image sizes.
+IMAGE_MARK = '\x01'
+IMAGE_MARK_RE = re.compile(r'(src=")?\x01([^\x01]*)\x01')
+
+# Approximate size (characters of keys and HTML) of a caching converter's
+# inline and block caches; see MarkdownConverter(cache=True)
+INLINE_CACHE_BYTES = 2 * 1024 * 1024
+BLOCK_CACHE_BYTES = 8 * 1024 * 1024
+# Number of distinct template texts kept compiled
+TEMPLATE_CACHE_SIZE = 16
+
+
+CacheInfo = namedtuple("CacheInfo", "hits misses entries size")
+
+
+class RenderCache:
+    """LRU cache of rendered HTML bounded by the size of what it holds.
+    
+    key turns the argument into the cache key (e.g. a digest, so a large
+    source block is not kept alive by the cache); size counts characters
+    of keys and values, an approximation of the memory they take.
+    """
+    
+    def __init__(self, render, max_size, key=None):
+        self.render = render
+        self.max_size = max_size
+        self.key = key
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+    
+    def __call__(self, value):
+        key = self.key(value) if self.key else value
+        rendered = self.entries.get(key)
+        if rendered is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return rendered
+        self.misses += 1
+        rendered = self.render(value)
+        size = len(key) + len(rendered)
+        if size <= self.max_size:
+            self.entries[key] = rendered
+            self.size += size
+            while self.size > self.max_size:
+                old_key, old = self.entries.popitem(last=False)
+                self.size -= len(old_key) + len(old)
+        return rendered
+    
+    def cache_info(self):
+        return CacheInfo(self.hits, self.misses, len(self.entries), self.size)
+    
+    def cache_clear(self):
+        self.entries.clear()
+        self.size = self.hits = self.misses = 0
+
+
+def block_digest(block):
+    """Return the cache key of a source block (a tuple of lines)"""
+    return hashlib.blake2b("\n".join(block).encode("utf-8"), digest_size=16).digest()
 
 
 class MarkdownConverter:
-    """Markdown to HTML converter using regex patterns"""
+    """Markdown to HTML converter using a single-pass line tokenizer"""
     
-    def __init__(self):
+    def __init__(self, base_dir=None, cache=False):
+        # Directory of the generated page, used to find referenced images
+        self.base_dir = base_dir
+        # {absolute asset path: absolute fingerprinted path}, see assets.py
+        self.asset_paths = None
+        
+        # Inline patterns, applied in order to the text of each line. The
+        # last item is a substring the pattern needs, checked before re.sub.
         self.patterns = [
-            # Headers
-            (r'^### (.*)$', r'<h3>\1</h3>'),
-            (r'^## (.*)$', r'<h2>\1</h2>'),
-            (r'^# (.*)$', r'<h1>\1</h1>'),
-            
             # Bold and italic
-            (r'\*\*(.*?)\*\*', r'<strong>\1</strong>'),
-            (r'\*(.*?)\*', r'<em>\1</em>'),
+            (re.compile(r'\*\*(.*?)\*\*'), r'<strong>\1</strong>', '**'),
+            (re.compile(r'\*(.*?)\*'), r'<em>\1</em>', '*'),
             
-            # Code blocks
-            (r'```(.*?)```', r'<pre><code>\1</code></pre>', re.DOTALL),
-            (r'`(.*?)`', r'<code>\1</code>'),
+            # Inline code
+            (re.compile(r'`(.*?)`'), r'<code>\1</code>', '`'),
             
             # Images with optional title/caption
-            (r'!\[([^\]]*)\]\(([^\)\s]+)\s+"([^"]*)"\)', r'<figure><img src="\2" alt="\1"><figcaption>\3</figcaption></figure>'),
-            (r'!\[([^\]]*)\]\(([^)]+)\)', r'<img src="\2" alt="\1">'),
+            (re.compile(r'!\[([^\]]*)\]\(([^\)\s]+)\s+"([^"]*)"\)'), self._render_figure, '!['),
+            (re.compile(r'!\[([^\]]*)\]\(([^)]+)\)'), self._render_image, '!['),
             # Links
-            (r'\[([^\]]+)\]\(([^)]+)\)', r'<a href="\2">\1</a>'),
-            
-            # Line breaks are handled later by paragraph wrapping
+            (re.compile(r'\[([^\]]+)\]\(([^)]+)\)'), r'<a href="\2">\1</a>', ']('),
         ]
+        
+        # A long-lived converter (serve.py) memoises the inline passes per
+        # line, since headers, links and boilerplate recur across articles
+        # and rebuilds, and the rendered HTML of each block, so an edited
+        # article only re-renders the blocks that changed. A one-shot
+        # conversion renders everything once and keeps nothing, so streaming
+        # stays bounded by the largest block.
+        self._render_inline_cached = self._render_inline_text
+        self._render_block_cached = self._render_block
+        if cache:
+            self._render_inline_cached = RenderCache(self._render_inline_text, INLINE_CACHE_BYTES)
+            self._render_block_cached = RenderCache(self._render_block, BLOCK_CACHE_BYTES,
+                                                    block_digest)
     
     def convert(self, markdown_text):
         """Convert markdown text to HTML"""
         # Remove first line (title) and process content
         lines = markdown_text.splitlines()
         if lines and lines[0].startswith('#'):
-            content_lines = lines[1:]
-        else:
-            content_lines = lines
-
-        # Extract fenced code blocks first and replace them with placeholders.
-        # This keeps their contents from being interpreted as markdown
-        # (headers, lists, blockquotes...) and preserves indentation/newlines.
-        code_blocks = []
-        extracted_lines = []
+            lines = lines[1:]
+        return '\n'.join(self._iter_rendered(lines))
+    
+    def iter_convert(self, fileobj):
+        """Convert markdown read from a text file object, yielding HTML chunks.
+        
+        Chunks are yielded as blocks complete, so memory stays bounded by
+        the largest block (a run of lines between blank lines) instead of
+        the article. ''.join() of the chunks equals convert() of the whole
+        text.
+        """
+        first = True
+        for block in self._iter_rendered(self._iter_source_lines(fileobj)):
+            if first:
+                first = False
+                yield block
+            else:
+                yield '\n' + block
+    
+    @staticmethod
+    def _iter_source_lines(fileobj):
+        """Yield the lines of fileobj like str.splitlines(), minus the title"""
+        first = True
+        for physical_line in fileobj:
+            for line in physical_line.splitlines():
+                if first:
+                    first = False
+                    # Remove first line (title)
+                    if line.startswith('#'):
+                        continue
+                yield line
+    
+    @staticmethod
+    def _iter_source_blocks(lines):
+        """Group lines into blocks separated by blank lines outside code fences.
+        
+        The tokenizer closes every list, blockquote and paragraph at such a
+        blank line, so each block renders the same on its own as it does
+        within the document. Blocks are tuples of lines without the blanks.
+        """
+        block = []
+        in_code = False
+        for line in lines:
+            if '```' in line and line.lstrip().startswith('```'):
+                in_code = not in_code
+            elif not in_code and not line.strip():
+                if block:
+                    yield tuple(block)
+                    block = []
+                continue
+            block.append(line)
+        if block:
+            yield tuple(block)
+    
+    def _render_block(self, block):
+        """Render one source block; image attributes are left marked"""
+        return '\n'.join(self._iter_blocks(block))
+    
+    def _iter_rendered(self, lines):
+        """Yield the rendered HTML of each source block, reusing unchanged ones"""
+        for block in self._iter_source_blocks(lines):
+            rendered = self._render_block_cached(block)
+            if not rendered:
+                continue
+            if IMAGE_MARK in rendered:
+                rendered = self._fill_images(rendered)
+            yield rendered
+    
+    def _fill_images(self, rendered):
+        return IMAGE_MARK_RE.sub(self._fill_image, rendered)
+    
+    def _fill_image(self, match):
+        prefix, src = match.groups()
+        if prefix:
+            return prefix + self.image_src(src)
+        return self.image_attributes(src)
+    
+    def render_inline(self, text):
+        """Apply the inline patterns (code, emphasis, images, links) to text"""
+        rendered = self._render_inline_cached(text)
+        if IMAGE_MARK in rendered:
+            rendered = self._fill_images(rendered)
+        return rendered
+    
+    def _render_inline_text(self, text):
+        """Run the inline patterns; images are left with an attribute mark"""
+        if '```' in text:
+            text = INLINE_FENCE_RE.sub(r'<pre><code>\1</code></pre>', text)
+        for pattern, replacement, needle in self.patterns:
+            if needle in text:
+                text = pattern.sub(replacement, text)
+        return text
+    
+    def inline_cache_info(self):
+        """Return the hits, misses, entries and size of the inline cache"""
+        return self._cache_info(self._render_inline_cached)
+    
+    def block_cache_info(self):
+        """Return the hits, misses, entries and size of the block cache"""
+        return self._cache_info(self._render_block_cached)
+    
+    @staticmethod
+    def _cache_info(cached):
+        if isinstance(cached, RenderCache):
+            return cached.cache_info()
+        return CacheInfo(0, 0, 0, 0)
+    
+    def image_src(self, src):
+        """Return src, pointing at the fingerprinted image if there is one"""
+        if not self.asset_paths or not self.base_dir:
+            return src
+        from assets import asset_url
+        
+        return asset_url(src, self.base_dir, self.asset_paths)
+    
+    def image_attributes(self, src):
+        """Return intrinsic size and lazy-loading attributes for an <img>"""
+        attrs = ''
+        if self.base_dir and is_local_url(src):
+            size = image_size(os.path.normpath(os.path.join(self.base_dir, src)))
+            if size:
+                attrs = f' width="{size[0]}" height="{size[1]}"'
+        return attrs + ' loading="lazy" decoding="async"'
+    
+    def _render_figure(self, match):
+        alt, src, caption = match.groups()
+        return (f'<figure><img src="{IMAGE_MARK}{src}{IMAGE_MARK}" alt="{alt}"{IMAGE_MARK}{src}{IMAGE_MARK}>'
+                f'<figcaption>{caption}</figcaption></figure>')
+    
+    def _render_image(self, match):
+        alt, src = match.groups()
+        return f'<img src="{IMAGE_MARK}{src}{IMAGE_MARK}" alt="{alt}"{IMAGE_MARK}{src}{IMAGE_MARK}>'
+    
+    @staticmethod
+    def _cleanup_breaks(line, content):
+        """Drop <br> tags next to list tags; content is the rendered text"""
+        if '<ul>' in content or '<li>' in content or '</ul>' in content or '</li>' in content:
+            for pattern, replacement in BR_CLEANUP_PATTERNS:
+                line = pattern.sub(replacement, line)
+        return line
+    
+    @staticmethod
+    def _code_block(code_lines):
+        """Render buffered fenced code lines as a marked <pre> line"""
+        from html import escape
+        
+        escaped = '\n'.join(escape(l, quote=False) for l in code_lines)
+        return f'{CODE_MARK}<pre><code>{escaped}</code></pre>'
+    
+    def _iter_lines(self, lines):
+        """Classify each source line once and yield rendered output lines.
+        
+        Structural lines (<ul>, </li>, <blockquote>, headers...) and text
+        lines are yielded in document order; paragraph wrapping is left to
+        _iter_blocks. Fenced code blocks are yielded as one line starting
+        with CODE_MARK so their contents are never treated as markdown.
+        """
+        current_depth = 0  # 0 means not inside any list
+        li_open = False    # whether a <li> is currently open at current_depth
+        current_bq_depth = 0  # 0 means not inside any blockquote
         in_code = False
         code_buffer = []
-        for raw_line in content_lines:
-            if raw_line.lstrip().startswith('```'):
+        out = []
+        
+        def close_lists():
+            nonlocal current_depth, li_open
+            if li_open:
+                out.append('</li>')
+                li_open = False
+            while current_depth > 0:
+                out.append('</ul>')
+                current_depth -= 1
+                # when closing a level, also close the parent li if it was awaiting siblings
+                if current_depth > 0:
+                    out.append('</li>')
+        
+        for raw_line in lines:
+            if out:
+                yield from out
+                out.clear()
+            
+            if '```' in raw_line and raw_line.lstrip().startswith('```'):
                 if not in_code:
                     # opening fence (language identifier, if any, is ignored)
                     in_code = True
                     code_buffer = []
-                else:
-                    # closing fence
-                    in_code = False
-                    escaped = '\n'.join(
-                        html.escape(l, quote=False) for l in code_buffer
-                    )
-                    placeholder = f'CODEBLOCKPLACEHOLDER{len(code_blocks)}'
-                    code_blocks.append(f'<pre><code>{escaped}</code></pre>')
-                    extracted_lines.append(placeholder)
+                    continue
+                # closing fence: the block takes the place of a text line
+                in_code = False
+                block = self._code_block(code_buffer)
+                code_buffer = []
+                out.append('<br>' + block if li_open else block)
                 continue
             if in_code:
                 code_buffer.append(raw_line)
-            else:
-                extracted_lines.append(raw_line)
-        # Unterminated code block: flush whatever was buffered.
-        if in_code and code_buffer:
-            escaped = '\n'.join(html.escape(l, quote=False) for l in code_buffer)
-            placeholder = f'CODEBLOCKPLACEHOLDER{len(code_blocks)}'
-            code_blocks.append(f'<pre><code>{escaped}</code></pre>')
-            extracted_lines.append(placeholder)
-        content_lines = extracted_lines
-
-        # Process line by line with nested list support
-        processed_lines = []
-        current_depth = 0  # 0 means not inside any list
-        li_open = False    # whether a <li> is currently open at current_depth
-        current_bq_depth = 0  # 0 means not inside any blockquote
-
-        for raw_line in content_lines:
-            if not raw_line.strip():
+                continue
+            
+            line_stripped = raw_line.strip()
+            if not line_stripped:
                 # Empty line - close all open structures gracefully
-                if li_open:
-                    processed_lines.append('</li>')
-                    li_open = False
-                while current_depth > 0:
-                    processed_lines.append('</ul>')
-                    current_depth -= 1
-                    # when closing a level, also close the parent li if it was awaiting siblings
-                    if current_depth > 0:
-                        processed_lines.append('</li>')
+                close_lists()
                 # Close any open blockquotes on empty line (simple behavior)
                 while current_bq_depth > 0:
-                    processed_lines.append('</blockquote>')
+                    out.append('</blockquote>')
                     current_bq_depth -= 1
-
-                processed_lines.append('')  # empty line marker
+                out.append('')  # empty line marker
                 continue
-
+            
             # Detect blockquote lines (one or more leading '>' possibly with spaces)
-            m_bq = re.match(r'^(?P<markers>(?:>\s*)+)(.*)$', raw_line)
-            if m_bq:
-                markers = m_bq.group('markers')
+            if raw_line.startswith('>'):
+                m_bq = BLOCKQUOTE_RE.match(raw_line)
                 # Count '>' characters to determine nesting depth
-                target_bq = markers.count('>')
-
+                target_bq = m_bq.group('markers').count('>')
+                
                 # Adjust blockquote depth (open or close tags as needed)
                 if target_bq > current_bq_depth:
                     for _ in range(current_bq_depth, target_bq):
-                        processed_lines.append('<blockquote>')
-                    current_bq_depth = target_bq
+                        out.append('<blockquote>')
                 elif target_bq < current_bq_depth:
                     for _ in range(current_bq_depth - target_bq):
-                        processed_lines.append('</blockquote>')
-                    current_bq_depth = target_bq
-
+                        out.append('</blockquote>')
+                current_bq_depth = target_bq
+                
                 # Replace raw_line with the inner content after the '>' markers
                 raw_line = m_bq.group(2)
-
-            line_stripped = raw_line.strip()
-
+                line_stripped = raw_line.strip()
+            
             # Check for headers (operate outside of lists)
-            if re.match(r'^### (.*)$', line_stripped):
-                if li_open:
-                    processed_lines.append('</li>')
-                    li_open = False
-                while current_depth > 0:
-                    processed_lines.append('</ul>')
-                    current_depth -= 1
-                    if current_depth > 0:
-                        processed_lines.append('</li>')
-                processed_lines.append(f'<h3>{re.match(r"^### (.*)$", line_stripped).group(1)}</h3>')
-                continue
-            elif re.match(r'^## (.*)$', line_stripped):
-                if li_open:
-                    processed_lines.append('</li>')
-                    li_open = False
-                while current_depth > 0:
-                    processed_lines.append('</ul>')
-                    current_depth -= 1
-                    if current_depth > 0:
-                        processed_lines.append('</li>')
-                processed_lines.append(f'<h2>{re.match(r"^## (.*)$", line_stripped).group(1)}</h2>')
-                continue
-            elif re.match(r'^# (.*)$', line_stripped):
-                if li_open:
-                    processed_lines.append('</li>')
-                    li_open = False
-                while current_depth > 0:
-                    processed_lines.append('</ul>')
-                    current_depth -= 1
-                    if current_depth > 0:
-                        processed_lines.append('</li>')
-                processed_lines.append(f'<h1>{re.match(r"^# (.*)$", line_stripped).group(1)}</h1>')
-                continue
-
+            if line_stripped.startswith('#'):
+                level = 0
+                if line_stripped.startswith('### '):
+                    level = 3
+                elif line_stripped.startswith('## '):
+                    level = 2
+                elif line_stripped.startswith('# '):
+                    level = 1
+                if level:
+                    close_lists()
+                    content = self._render_inline_cached(line_stripped[level + 1:])
+                    line = f'<h{level}>{content}</h{level}>'
+                    out.append(self._cleanup_breaks(line, content))
+                    continue
+            
             # Detect unordered list item with indent (supports -, *, +)
-            m = re.match(r'^(\s*)([-*+])\s+(.*)$', raw_line)
+            m = LIST_ITEM_RE.match(raw_line) if line_stripped[:1] in '-*+' else None
             if m:
                 indent = m.group(1)
-                content_text = m.group(3)
                 # tabs count as 4 spaces; one nesting level per 2 spaces
                 indent_spaces = len(indent.replace('\t', '    '))
                 target_depth = indent_spaces // 2 + 1
-
+                
                 # Adjust depth
                 if target_depth > current_depth:
-                    # open new <ul> levels (if increasing without an open li at top, it's fine)
                     # when increasing from >=1, keep current <li> open so nested <ul> is inside it
                     for _ in range(current_depth, target_depth):
-                        processed_lines.append('<ul>')
+                        out.append('<ul>')
                     current_depth = target_depth
                 elif target_depth == current_depth:
                     if li_open:
-                        processed_lines.append('</li>')
+                        out.append('</li>')
                         li_open = False
                 else:  # target_depth < current_depth
                     if li_open:
-                        processed_lines.append('</li>')
+                        out.append('</li>')
                         li_open = False
                     # close levels down to target_depth
                     for _ in range(current_depth - target_depth):
-                        processed_lines.append('</ul>')
+                        out.append('</ul>')
                         # after closing a nested list, we are back inside a parent <li>
                         # that parent <li> should end before starting next sibling
-                        processed_lines.append('</li>')
+                        out.append('</li>')
                     current_depth = target_depth
-
+                
                 # Start new list item
-                processed_lines.append(f'<li>{content_text}')
+                content = self._render_inline_cached(m.group(3))
+                out.append(self._cleanup_breaks(f'<li>{content}', content))
                 li_open = True
                 continue
-
+            
             # Regular paragraph/text line
+            content = self._render_inline_cached(line_stripped)
             if li_open:
                 # Text line after an open <li> indicates continuation of the same list item
-                processed_lines.append('<br>' + line_stripped)
+                out.append(self._cleanup_breaks('<br>' + content, content))
                 continue
-
+            
             # Not in list context
-            processed_lines.append(line_stripped)
-
+            out.append(self._cleanup_breaks(content, content))
+        
+        # Unterminated code block: flush whatever was buffered.
+        if in_code and code_buffer:
+            block = self._code_block(code_buffer)
+            out.append('<br>' + block if li_open else block)
         # Close any remaining open list structures
-        if li_open:
-            processed_lines.append('</li>')
-            li_open = False
-        while current_depth > 0:
-            processed_lines.append('</ul>')
-            current_depth -= 1
-            if current_depth > 0:
-                processed_lines.append('</li>')
+        close_lists()
         # Close any remaining open blockquotes
         while current_bq_depth > 0:
-            processed_lines.append('</blockquote>')
+            out.append('</blockquote>')
             current_bq_depth -= 1
-        
-        content = '\n'.join(processed_lines)
-        
-        # Process code blocks
-        content = re.sub(r'```(.*?)```', r'<pre><code>\1</code></pre>', content, flags=re.DOTALL)
-        
-        # Apply other conversion patterns
-        for pattern, replacement, *flags in self.patterns:
-            if pattern.startswith('```') or pattern.startswith('^#'):  # Skip already processed patterns
-                continue
-            if flags:
-                content = re.sub(pattern, replacement, content, flags=flags[0])
-            else:
-                content = re.sub(pattern, replacement, content)
-        
-        # Clean up br tags around lists
-        content = re.sub(r'<br>\s*<ul>', '<ul>', content)
-        content = re.sub(r'</ul>\s*<br>', '</ul>', content)
-        content = re.sub(r'<br>\s*<li>', '<li>', content)
-        content = re.sub(r'</li>\s*<br>', '</li>', content)
-        content = re.sub(r'</li>\s*<ul>', '<ul>', content)
-        
-        # Process content preserving empty lines
-        lines = content.split('\n')
-        wrapped_paragraphs = []
+        yield from out
+    
+    @staticmethod
+    def _paragraph(para):
+        """Wrap buffered text lines in <p>, leaving a lone code block bare"""
+        if len(para) == 1 and para[0].startswith(CODE_MARK):
+            return para[0][1:]
+        para_text = '<br>'.join(para)
+        if CODE_MARK in para_text:
+            para_text = para_text.replace(CODE_MARK, '')
+        return f'<p>{para_text}</p>'
+    
+    def _iter_blocks(self, lines):
+        """Yield the top-level HTML elements of the document in order"""
         current_para = []
-
-        for line in lines:
+        
+        for line in self._iter_lines(lines):
             # Handle special elements (don't strip these)
-            if (line.startswith('<pre><code>') and line.endswith('</code></pre>')) or \
-               line.startswith('<h') or line.startswith('<figure>') or line.startswith('</figure>') or \
-               line.startswith('<ul>') or line.startswith('<li>') or line.startswith('</ul>') or line.startswith('</li>') or line.startswith('<blockquote>') or line.startswith('</blockquote>'):
+            if line.startswith(SPECIAL_PREFIXES) or \
+               (line.startswith('<pre><code>') and line.endswith('</code></pre>')):
+                # A lone <br> continuation directly before a nested list is dropped
+                if line == '<ul>' and current_para and current_para[-1] == '<br>':
+                    current_para.pop()
                 # Flush current paragraph if any
                 if current_para:
-                    para_text = '\n'.join(current_para)
-                    para_text = re.sub(r'\n', '<br>', para_text)
-                    wrapped_paragraphs.append(f'<p>{para_text}</p>')
+                    yield self._paragraph(current_para)
                     current_para = []
-
+                
                 # Add special element
-                wrapped_paragraphs.append(line)
+                yield line
             elif not line.strip():
                 # Empty line - flush current paragraph but don't add br
                 if current_para:
-                    para_text = '\n'.join(current_para)
-                    para_text = re.sub(r'\n', '<br>', para_text)
-                    wrapped_paragraphs.append(f'<p>{para_text}</p>')
+                    yield self._paragraph(current_para)
                     current_para = []
                 # Don't add <br> for empty lines - let CSS handle spacing
             else:
                 # Regular line - add to current paragraph
                 current_para.append(line.strip())
-
+        
         # Flush remaining paragraph
         if current_para:
-            para_text = '\n'.join(current_para)
-            para_text = re.sub(r'\n', '<br>', para_text)
-            wrapped_paragraphs.append(f'<p>{para_text}</p>')
-
-        # Join all elements
-        result = '\n'.join(wrapped_paragraphs)
-
-        # Restore extracted code blocks. A placeholder on its own line was
-        # wrapped in a <p>...</p>; strip that wrapper so the <pre> stands alone.
-        for i, block_html in enumerate(code_blocks):
-            placeholder = f'CODEBLOCKPLACEHOLDER{i}'
-            result = result.replace(f'<p>{placeholder}</p>', block_html)
-            result = result.replace(placeholder, block_html)
-        return result
-    
+            yield self._paragraph(current_para)
 
 
 def load_file(file_path):
@@ -307,137 +508,1158 @@ def load_file(file_path):
         return None
 
 
+# Written/unchanged counts of the output layer, reported by build_site
+output_stats = {"written": 0, "unchanged": 0}
+# Directories already known to exist, so each is created at most once
+_known_directories = set()
+
+
+def reset_output_stats():
+    """Reset the written/unchanged counters and return their previous values"""
+    previous = dict(output_stats)
+    output_stats.update(written=0, unchanged=0)
+    return previous
+
+
+def ensure_directory(directory):
+    """Create directory (and its parents) unless it was already seen"""
+    if directory and directory not in _known_directories:
+        os.makedirs(directory, exist_ok=True)
+        _known_directories.add(directory)
+
+
+def file_digest(file_path):
+    """Return the sha256 digest of a file, read in blocks"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.digest()
+
+
+def _same_content(file_path, size, digest):
+    """Return whether file_path already holds size bytes hashing to digest"""
+    try:
+        if os.path.getsize(file_path) != size:
+            return False
+        return file_digest(file_path) == digest
+    except OSError:
+        return False
+
+
+def _replace_file(file_path, tmp_path, size, digest):
+    """Move a fully written temp file into place unless nothing changed"""
+    if _same_content(file_path, size, digest):
+        os.remove(tmp_path)
+        output_stats["unchanged"] += 1
+        return
+    os.replace(tmp_path, file_path)
+    output_stats["written"] += 1
+
+
+def save_file_chunks(file_path, chunks):
+    """Save an iterable of strings to file with error handling.
+    
+    The chunks are streamed into a temp file next to the target, which
+    replaces the target only if its size or hash differ, so an unchanged
+    page keeps its mtime and a crash never leaves a half-written file.
+    """
+    tmp_path = f"{file_path}.tmp"
+    try:
+        ensure_directory(os.path.dirname(file_path))
+        
+        digest = hashlib.sha256()
+        size = 0
+        with open(tmp_path, "wb") as f:
+            for chunk in chunks:
+                data = chunk.encode("utf-8")
+                digest.update(data)
+                size += len(data)
+                f.write(data)
+        _replace_file(file_path, tmp_path, size, digest.digest())
+        return True
+    except Exception as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        print(f"エラー: ファイル '{file_path}' の保存に失敗しました: {e}")
+        return False
+
+
 def save_file(file_path, content):
-    """Save content to file with error handling"""
+    """Save content to file with error handling, only when it changed.
+    
+    The size is compared first and the hash only on a size match; a
+    changed file is written to a temp file and moved into place.
+    """
+    tmp_path = f"{file_path}.tmp"
     try:
-        # Create directory if it doesn't exist
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        ensure_directory(os.path.dirname(file_path))
         
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.write(content)
+        data = content.encode("utf-8")
+        digest = hashlib.sha256(data).digest()
+        if _same_content(file_path, len(data), digest):
+            output_stats["unchanged"] += 1
+            return True
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, file_path)
+        output_stats["written"] += 1
         return True
     except Exception as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
         print(f"エラー: ファイル '{file_path}' の保存に失敗しました: {e}")
         return False
 
 
-def extract_date_from_html(html_file):
-    """Extract existing date from HTML file"""
-    if not os.path.exists(html_file):
-        return None
+def find_page_date(content, label):
+    """Return the date written after 'label: ' in a generated page"""
+    match = re.search(rf'{label}: ([^<]+)', content)
+    return match.group(1).strip() if match else None
+
+
+# Template slots look like {title}; unknown slots are left as written
+TEMPLATE_SLOT_RE = re.compile(r'\{(\w+)\}')
+
+
+class CompiledTemplate:
+    """Template parsed once into literal and {slot} segments"""
     
-    content = load_file(html_file)
-    if not content:
+    def __init__(self, text):
+        self.text = text
+        self.digest = hash_text(text)
+        # Even indexes hold literal text, odd indexes hold slot names
+        self.segments = TEMPLATE_SLOT_RE.split(text)
+    
+    def iter_render(self, values):
+        """Yield the rendered template piece by piece.
+        
+        A slot value may be a string or an iterable of string chunks (e.g.
+        the output of MarkdownConverter.iter_convert), which is streamed.
+        """
+        segments = self.segments
+        for i, segment in enumerate(segments):
+            if not i % 2:
+                if segment:
+                    yield segment
+                continue
+            value = values.get(segment)
+            if value is None:
+                yield f"{{{segment}}}"
+            elif isinstance(value, str):
+                yield value
+            else:
+                yield from value
+    
+    def render(self, values):
+        """Render the template to a string in a single join"""
+        return "".join(self.iter_render(values))
+
+
+_template_files = {}
+
+
+# The cache is keyed by the template text, so edits made while serve.py
+# runs and --fingerprint rewrites each add an entry; old ones are evicted.
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def compile_template(text):
+    """Return the CompiledTemplate for a template string, parsing it once"""
+    return CompiledTemplate(text)
+
+
+def load_template(template_file):
+    """Load and compile a template file, cached by its mtime and size"""
+    try:
+        st = os.stat(template_file)
+    except OSError:
+        print(f"エラー: ファイル '{template_file}' が見つかりません")
+        return None
+    cached = _template_files.get(template_file)
+    if cached and cached[0] == (st.st_mtime_ns, st.st_size):
+        return cached[1]
+    text = load_file(template_file)
+    if not text:
         return None
+    compiled = compile_template(text)
+    _template_files[template_file] = ((st.st_mtime_ns, st.st_size), compiled)
+    return compiled
+
+
+def _template_values(title, content, existing_date, updated, slots):
+    """Collect the slot values of an article page"""
+    now = None
+    if not existing_date or not updated:
+        now = time.strftime("%Y年%m月%d日 %H:%M:%S")
+    values = dict(slots)
+    values.update(title=title, date=existing_date or now, updated=updated or now, content=content)
+    return values
+
+
+def generate_html_template(template, title, content, existing_date=None, updated=None, **slots):
+    """Generate HTML from template (a string or a CompiledTemplate).
     
-    # Look for date pattern
-    date_pattern = r'投稿日: ([^<]+)'
-    match = re.search(date_pattern, content)
+    Extra keyword arguments fill additional slots such as {description}.
+    """
+    if isinstance(template, str):
+        template = compile_template(template)
+    return template.render(_template_values(title, content, existing_date, updated, slots))
+
+
+def iter_html_template(template, title, chunks, existing_date=None, updated=None,
+                       minify=False, minify_stats=None, **slots):
+    """Yield the template with chunks streamed into its {content} slot.
     
-    return match.group(1).strip() if match else None
+    With minify, the rendered stream goes through iter_minify on its way
+    out; minify_stats collects the sizes before and after.
+    """
+    if isinstance(template, str):
+        template = compile_template(template)
+    rendered = template.iter_render(_template_values(title, chunks, existing_date, updated, slots))
+    return iter_minify(rendered, minify_stats) if minify else rendered
 
 
-def generate_html_template(template, title, content, existing_date=None):
-    """Generate HTML from template"""
-    date = (
-        existing_date
-        if existing_date
-        else datetime.now().strftime("%Y年%m月%d日 %H:%M:%S")
-    )
-    updated = datetime.now().strftime("%Y年%m月%d日 %H:%M:%S")
+# Elements whose surrounding whitespace never renders
+MINIFY_BLOCK_TAGS = frozenset((
+    "html", "head", "body", "meta", "title", "link", "script", "style",
+    "header", "footer", "article", "section", "nav", "div", "p", "br", "hr",
+    "h1", "h2", "h3", "h4", "h5", "h6", "ul", "ol", "li", "blockquote",
+    "pre", "figure", "figcaption", "table", "thead", "tbody", "tr", "th", "td",
+))
+# Elements whose contents are copied byte for byte. Inline <code> is
+# included because style.css gives it white-space: pre-wrap.
+MINIFY_RAW_TAGS = {
+    tag: re.compile(rf'</{tag}\b', re.IGNORECASE)
+    for tag in ("pre", "code", "script", "style", "textarea")
+}
+# Only ASCII whitespace collapses; U+3000 and friends are content
+MINIFY_TOKEN_RE = re.compile(
+    r'<!--.*?-->|<![^>]*>|<(/?)([A-Za-z][\w-]*)[^>]*>|[ \t\r\n\f]+|[^< \t\r\n\f]+|<',
+    re.DOTALL,
+)
+
+
+def iter_minify(chunks, stats=None):
+    """Yield the HTML of chunks with insignificant whitespace removed.
+    
+    Whitespace between tags is dropped next to block-level elements and
+    every other run collapses to a single space. The contents of <pre>,
+    <code>, <script>, <style> and <textarea> are copied unchanged. Works on a
+    stream, so it runs inside the template render without a second pass.
+    When stats is a dict, the input and output sizes are added to it.
+    """
+    pending = ""
+    raw_tag = None
+    space = False
+    after_block = True
+    chunks = iter(chunks)
+    done = False
+    while not done:
+        chunk = next(chunks, None)
+        if chunk is None:
+            done = True
+            chunk = ""
+        text = pending + chunk
+        pending = ""
+        
+        # Hold back a tag that is cut off at the end of the chunk
+        limit = len(text)
+        if not done:
+            start = text.rfind("<")
+            if start >= 0 and text.find(">", start) < 0:
+                limit = start
+        
+        out = []
+        pos = 0
+        while pos < len(text):
+            if raw_tag:
+                match = MINIFY_RAW_TAGS[raw_tag].search(text, pos)
+                if match is None:
+                    # Keep enough text back to find a closing tag split in two
+                    keep = len(text) if done else max(pos, len(text) - len(raw_tag) - 2)
+                    out.append(text[pos:keep])
+                    pending = text[keep:]
+                    break
+                out.append(text[pos:match.start()])
+                pos = match.start()
+                raw_tag = None
+                after_block = False
+                space = False
+                continue
+            if pos >= limit:
+                pending = text[pos:]
+                break
+            
+            match = MINIFY_TOKEN_RE.match(text, pos, limit)
+            token = match.group()
+            pos = match.end()
+            if token[0] in " \t\r\n\f":
+                space = True
+                continue
+            name = match.group(2)
+            name = name.lower() if name else None
+            block = token.startswith("<!") or name in MINIFY_BLOCK_TAGS
+            if space and not (block or after_block):
+                out.append(" ")
+            space = False
+            out.append(token)
+            after_block = block
+            if name in MINIFY_RAW_TAGS and not match.group(1) and not token.endswith("/>"):
+                raw_tag = name
+        
+        minified = "".join(out)
+        if stats is not None:
+            stats["input"] = stats.get("input", 0) + len(chunk)
+            stats["output"] = stats.get("output", 0) + len(minified)
+        if minified:
+            yield minified
+
+
+def load_manifest(manifest_path):
+    """Load the build manifest; a missing or broken manifest is empty"""
+    if not manifest_path or not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"警告: マニフェスト '{manifest_path}' を読み込めません: {e}")
+        return {}
+    return data.get("entries", {}) if isinstance(data, dict) else {}
+
+
+def save_manifest(manifest_path, entries):
+    """Save the build manifest with a stable key order"""
+    content = json.dumps({"entries": entries}, ensure_ascii=False, indent=2, sort_keys=True)
+    return save_file(manifest_path, content + "\n")
+
+
+def hash_text(text):
+    """Return the sha256 hex digest of a string"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def source_digest(md_file, previous=None):
+    """Return (digest, size, mtime_ns) of a source file.
     
-    return template.replace("{title}", title).replace("{date}", date).replace("{updated}", updated).replace("{content}", content)
+    When size and mtime match the previous manifest entry the recorded
+    digest is reused, so a no-op rebuild only has to stat the sources.
+    """
+    st = os.stat(md_file)
+    if previous and previous.get("size") == st.st_size and previous.get("mtime_ns") == st.st_mtime_ns:
+        return previous["source_hash"], st.st_size, st.st_mtime_ns
+    with open(md_file, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    return digest, st.st_size, st.st_mtime_ns
 
 
-def update_blog_index(title, html_filename, blog_index_path):
-    """Update blog index with new entry or update existing entry"""
-    content = load_file(blog_index_path)
-    if not content:
-        return False
+# src of the <img> tags written by MarkdownConverter
+IMAGE_SRC_RE = re.compile(r'<img src="([^"]*)"')
+
+
+def image_stamps(srcs, page_dir):
+    """Return {src: [mtime_ns, size]} of the local images a page refers to.
     
-    # Extract filename for comparison
+    A missing image is recorded as None, so it is rebuilt once it appears.
+    """
+    stamps = {}
+    for src in srcs:
+        if not is_local_url(src):
+            continue
+        try:
+            st = os.stat(os.path.join(page_dir, src))
+        except OSError:
+            stamps[src] = None
+            continue
+        stamps[src] = [st.st_mtime_ns, st.st_size]
+    return stamps
+
+
+def index_href(html_filename):
+    """Return the blog index href (e.g. blog_html/x.html) of an output file"""
     filename = html_filename.replace("docs/", "")
-    filename = filename.replace("../", "")
-    
-    # Check if entry already exists by looking for the href pattern
-    href_pattern = rf'<a href="{re.escape(filename)}">'
-    existing_match = re.search(href_pattern, content)
-    
-    if existing_match:
-        # Update existing entry with new date
-        date = datetime.now().strftime("%Y年%m月%d日")
-        # Find the entire <li> tag and replace it
-        li_pattern = rf'<li><a href="{re.escape(filename)}">[^<]*</a>: [^<]*</li>'
-        new_entry = f'<li><a href="{filename}">{title}</a>: {date}</li>'
-        updated_content = re.sub(li_pattern, new_entry, content)
-        print(f"'{filename}' のエントリを更新しました")
-        return save_file(blog_index_path, updated_content)
-    
-    # Also check if the same title already exists with different filename
-    title_pattern = rf'<li><a href="[^"]*">{re.escape(title)}</a>: [^<]*</li>'
-    if re.search(title_pattern, content):
+    return filename.replace("../", "")
+
+
+# Entries of a blog index page rendered by render_blog_index
+INDEX_ENTRY_RE = re.compile(r'<li><a href="([^"]*)">([^<]*)</a>: ([^<]*)</li>')
+
+INDEX_TEMPLATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                   "template", "blog_index.html")
+
+
+def index_store_path(blog_index_path):
+    """Return the JSON sidecar path kept next to blog_index.html"""
+    return os.path.splitext(blog_index_path)[0] + ".json"
+
+
+def load_index_store(blog_index_path):
+    """Load the structured blog index keyed by href.
+    
+    The first time, the store is bootstrapped from the entries already
+    listed in blog_index.html so existing dates and order are kept.
+    """
+    store_path = index_store_path(blog_index_path)
+    if os.path.exists(store_path):
+        try:
+            with open(store_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)["entries"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"エラー: インデックス '{store_path}' を読み込めません: {e}")
+            return None
+    else:
+        content = load_file(blog_index_path)
+        if content is None:
+            return None
+        found = INDEX_ENTRY_RE.findall(content)
+        entries = {
+            href: {"title": title, "date": date.strip(), "seq": len(found) - i}
+            for i, (href, title, date) in enumerate(found)
+        }
+    return {
+        "entries": entries,
+        "titles": {entry["title"]: href for href, entry in entries.items()},
+        "seq": max((entry["seq"] for entry in entries.values()), default=0),
+    }
+
+
+def save_index_store(blog_index_path, store):
+    """Save the structured blog index with a stable key order"""
+    content = json.dumps({"entries": store["entries"]}, ensure_ascii=False, indent=2, sort_keys=True)
+    return save_file(index_store_path(blog_index_path), content + "\n")
+
+
+def upsert_index_entry(store, title, href, date):
+    """Insert or refresh one entry; returns False if the title is taken"""
+    entries = store["entries"]
+    if href not in entries and title in store["titles"]:
         print(f"タイトル '{title}' は既にインデックスに存在します（異なるファイル名）")
-        return True
+        return False
+    
+    if href in entries:
+        print(f"'{href}' のエントリを更新しました")
+        old_title = entries[href]["title"]
+        if store["titles"].get(old_title) == href:
+            del store["titles"][old_title]
+    store["seq"] += 1
+    entries[href] = {"title": title, "date": date, "seq": store["seq"]}
+    store["titles"][title] = href
+    return True
+
+
+def index_page_name(blog_index_path, page):
+    """Return the file name of a page: blog_index.html, blog_index_2.html, ..."""
+    base, ext = os.path.splitext(os.path.basename(blog_index_path))
+    return f"{base}{ext}" if page == 1 else f"{base}_{page}{ext}"
+
+
+def render_blog_index(store, template, blog_index_path, per_page=0):
+    """Render the index pages newest first; returns [(file name, html)]"""
+    if isinstance(template, str):
+        template = compile_template(template)
+    ordered = sorted(
+        store["entries"].items(),
+        key=lambda item: (item[1]["date"], item[1]["seq"]),
+        reverse=True,
+    )
+    per_page = per_page if per_page > 0 else max(len(ordered), 1)
+    chunks = [ordered[i:i + per_page] for i in range(0, len(ordered), per_page)] or [[]]
     
-    # Generate new entry
-    date = datetime.now().strftime("%Y年%m月%d日")
-    new_entry = f'<li><a href="{filename}">{title}</a>: {date}</li>'
+    pages = []
+    for number, chunk in enumerate(chunks, 1):
+        entries = "\n".join(
+            f'          <li><a href="{href}">{entry["title"]}</a>: {entry["date"]}</li>'
+            for href, entry in chunk
+        )
+        links = []
+        if number > 1:
+            links.append(f'<a href="{index_page_name(blog_index_path, number - 1)}">前のページ</a>')
+        if number < len(chunks):
+            links.append(f'<a href="{index_page_name(blog_index_path, number + 1)}">次のページ</a>')
+        pagination = ""
+        if links:
+            pagination = (
+                '\n\n      <div class="section">\n'
+                f'        <p>{" | ".join(links)}</p>\n'
+                '      </div>'
+            )
+        page_html = template.render({"entries": entries, "pagination": pagination})
+        pages.append((index_page_name(blog_index_path, number), page_html))
+    return pages
+
+
+def write_blog_index(store, blog_index_path, per_page=0):
+    """Render blog_index.html (and its extra pages) from the store"""
+    template = load_template(INDEX_TEMPLATE_FILE)
+    if template is None:
+        return False
     
-    # Insert new entry at the beginning of the list (newest first)
-    updated_content = content.replace("<ul>", f"<ul>\n          {new_entry}")
+    directory = os.path.dirname(blog_index_path)
+    pages = render_blog_index(store, template, blog_index_path, per_page)
+    for name, page_html in pages:
+        if not save_file(os.path.join(directory, name), page_html):
+            return False
     
-    return save_file(blog_index_path, updated_content)
+    # Remove pages left over from a build with more pages
+    base, ext = os.path.splitext(os.path.basename(blog_index_path))
+    page_re = re.compile(rf'{re.escape(base)}_(\d+){re.escape(ext)}$')
+    for name in os.listdir(directory or "."):
+        match = page_re.match(name)
+        if match and int(match.group(1)) > len(pages):
+            os.remove(os.path.join(directory, name))
+    return True
 
 
-def main(md_file, template_file, output_file, blog_index_file):
-    """Main conversion function"""
-    print(f"Markdownファイルを変換中: {md_file}")
+def update_blog_index_entries(entries, blog_index_path, per_page=0):
+    """Upsert several (title, html_filename) entries and render the index once"""
+    store = load_index_store(blog_index_path)
+    if store is None:
+        return False
+    
+    date = time.strftime("%Y年%m月%d日")
+    for title, html_filename in entries:
+        upsert_index_entry(store, title, index_href(html_filename), date)
     
-    # Load files
+    if not save_index_store(blog_index_path, store):
+        return False
+    return write_blog_index(store, blog_index_path, per_page)
+
+
+def update_blog_index(title, html_filename, blog_index_path, per_page=0):
+    """Update blog index with new entry or update existing entry"""
+    return update_blog_index_entries([(title, html_filename)], blog_index_path, per_page)
+
+
+def extract_title(md_content):
+    """Return the article title taken from the first '# ' line"""
+    lines = md_content.splitlines()
+    return lines[0].replace("# ", "") if lines and lines[0].startswith("#") else "Untitled"
+
+
+def check_article(md_file, output_file, manifest=None, template_hash=None, minify=False):
+    """Decide whether an article has to be rebuilt.
+    
+    Returns (needs_rebuild, state) where state is passed on to
+    write_article, or None if the source cannot be read. With a manifest,
+    an article whose source, template, converter version, minify mode and
+    referenced images are unchanged does not need a rebuild. An image is
+    checked by its mtime and size, since its width and height are written
+    into the page.
+    """
+    key = index_href(output_file)
+    state = {"key": key, "previous": None}
+    if manifest is None:
+        return True, state
+    
+    previous = manifest.get(key)
+    try:
+        digest, size, mtime_ns = source_digest(md_file, previous)
+    except OSError:
+        print(f"エラー: ファイル '{md_file}' が見つかりません")
+        return None
+    state.update(previous=previous, digest=digest, size=size, mtime_ns=mtime_ns)
+    if previous and previous.get("source_hash") == digest and os.path.exists(output_file):
+        if (previous.get("template_hash") == template_hash
+                and previous.get("converter_version") == CONVERTER_VERSION
+                and previous.get("minify", False) == minify
+                and "images" in previous):
+            images = previous["images"]
+            if images and image_stamps(images, os.path.dirname(output_file) or ".") != images:
+                return True, state
+            previous["size"], previous["mtime_ns"] = size, mtime_ns
+            return False, state
+    return True, state
+
+
+def render_source(converter, md_file):
+    """Read and convert one markdown file; returns (title, html) or None"""
     md_content = load_file(md_file)
-    template_content = load_file(template_file)
+    if not md_content:
+        return None
+    return extract_title(md_content), converter.convert(md_content)
+
+
+def read_title(md_file):
+    """Read only the first line of a markdown file and return its title"""
+    try:
+        with open(md_file, "r", encoding="utf-8") as f:
+            first_line = f.readline()
+    except FileNotFoundError:
+        print(f"エラー: ファイル '{md_file}' が見つかりません")
+        return None
+    except Exception as e:
+        print(f"エラー: ファイル '{md_file}' の読み込みに失敗しました: {e}")
+        return None
+    if not first_line:
+        return None
+    return extract_title(first_line)
+
+
+def iter_source_html(converter, md_file):
+    """Stream the converted HTML of a markdown file chunk by chunk"""
+    with open(md_file, "r", encoding="utf-8") as f:
+        yield from converter.iter_convert(f)
+
+
+_worker_converter = None
+
+
+def _render_worker(md_file, base_dir, asset_paths=None):
+    """ProcessPoolExecutor entry point reusing one converter per process"""
+    global _worker_converter
+    if _worker_converter is None:
+        _worker_converter = MarkdownConverter()
+    _worker_converter.base_dir = base_dir
+    _worker_converter.asset_paths = asset_paths
+    return render_source(_worker_converter, md_file)
+
+
+def _scan_images(chunks, image_srcs):
+    """Pass chunks through, adding the src of every <img> to image_srcs"""
+    for chunk in chunks:
+        if "<img" in chunk:
+            image_srcs.update(IMAGE_SRC_RE.findall(chunk))
+        yield chunk
+
+
+def write_article(title, html_content, template, output_file, state,
+                  manifest=None, template_hash=None, build_time=None, minify=False):
+    """Render the template and save one article.
     
-    if not md_content or not template_content:
-        print("必要なファイルの読み込みに失敗しました")
+    html_content is either the converted HTML or an iterable of HTML
+    chunks, which is streamed into the template's {content} slot.
+    Returns whether the markdown source itself changed, or None on failure.
+    A template-only change rebuilds the page but keeps its previous
+    updated date. With minify, the page is minified while it is rendered
+    and the bytes saved are printed.
+    """
+    previous = state["previous"]
+    now = build_time or time.strftime("%Y年%m月%d日 %H:%M:%S")
+    
+    # Dates come from the manifest; only pages it has no record of are read
+    posted = previous.get("posted") if previous else None
+    
+    # Keep the previous updated date when only the template/converter changed
+    changed = not (previous and previous.get("source_hash") == state["digest"])
+    updated = None if changed else previous.get("updated")
+    adopt = manifest is not None and previous is None
+    if (not posted or adopt) and os.path.exists(output_file):
+        existing_html = load_file(output_file) or ""
+        posted = posted or find_page_date(existing_html, "投稿日")
+        if adopt:
+            # First build with a manifest: adopt pages whose body is unchanged
+            if not isinstance(html_content, str):
+                html_content = "".join(html_content)
+            # The existing page may have been built with or without --minify
+            if (html_content in existing_html
+                    or "".join(iter_minify([html_content])) in existing_html):
+                changed = False
+                updated = find_page_date(existing_html, "更新日")
+    posted = posted or now
+    updated = updated or now
+    
+    # Collect the images of the page while it is rendered
+    image_srcs = set()
+    if isinstance(html_content, str):
+        image_srcs.update(IMAGE_SRC_RE.findall(html_content))
+    else:
+        html_content = _scan_images(html_content, image_srcs)
+    
+    # Render the template straight into the output file
+    minify_stats = {}
+    chunks = iter_html_template(template, title, html_content, posted, updated,
+                                minify, minify_stats)
+    if not save_file_chunks(output_file, chunks):
+        return None
+    if minify:
+        # Only ASCII whitespace is removed, so characters saved are bytes saved
+        saved = minify_stats.get("input", 0) - minify_stats.get("output", 0)
+        print(f"縮小: {output_file} ({saved} バイト削減)")
+    
+    if manifest is not None:
+        manifest[state["key"]] = {
+            "source_hash": state["digest"],
+            "size": state["size"],
+            "mtime_ns": state["mtime_ns"],
+            "template_hash": template_hash,
+            "converter_version": CONVERTER_VERSION,
+            "minify": minify,
+            "images": image_stamps(sorted(image_srcs), os.path.dirname(output_file) or "."),
+            "title": title,
+            "posted": posted,
+            "updated": updated,
+        }
+    return changed
+
+
+def _collect_text(chunks, text_parts):
+    """Pass chunks through, adding their plain text to text_parts"""
+    from search import html_text
+    
+    for chunk in chunks:
+        # Chunks are whole blocks, so no tag or entity is cut in two
+        text_parts.append(html_text(chunk))
+        yield chunk
+
+
+def convert_article(converter, md_file, template, output_file,
+                    manifest=None, template_hash=None, minify=False, text_parts=None):
+    """Convert one markdown file and save it.
+    
+    Returns (title, changed) where changed tells whether the markdown source
+    itself changed, or None on failure. An up-to-date article is skipped
+    and (None, False) is returned. When text_parts is a list, the plain
+    text of the article is added to it for the search index.
+    """
+    checked = check_article(md_file, output_file, manifest, template_hash, minify)
+    if checked is None:
+        return None
+    needs_rebuild, state = checked
+    if not needs_rebuild:
+        return None, False
+    
+    converter.base_dir = os.path.dirname(output_file) or "."
+    
+    # Stream the article straight into the template instead of
+    # materialising the whole converted document
+    title = read_title(md_file)
+    if title is None:
+        return None
+    html_chunks = iter_source_html(converter, md_file)
+    if text_parts is not None:
+        html_chunks = _collect_text(html_chunks, text_parts)
+    
+    changed = write_article(title, html_chunks, template, output_file, state,
+                            manifest, template_hash, minify=minify)
+    if changed is None:
+        return None
+    return title, changed
+
+
+def update_search_index(articles, rendered, search_dir, store_file=None, converter=None):
+    """Refresh the search store and write the index shards to search_dir.
+    
+    articles are the (md_file, output_file, state) of every source and
+    rendered maps the sources converted in this build to (title, html),
+    whose text is indexed as is. An article skipped by the manifest reuses
+    its stored text; one missing from the store is converted once here.
+    When nothing was converted and no article was added or removed, the
+    index is left as it is without reading the store.
+    """
+    from search import indexed_hrefs, load_search_store, search_document
+    
+    if (not rendered and store_file and os.path.exists(store_file)
+            and indexed_hrefs(search_dir) == {index_href(output_file) for _, output_file, _ in articles}):
+        return True
+    
+    store = load_search_store(store_file)
+    documents = {}
+    for md_file, output_file, state in articles:
+        href = index_href(output_file)
+        previous = store.get(href)
+        digest = state.get("digest")
+        result = rendered.get(md_file)
+        if result is None:
+            if previous and digest and previous.get("source_hash") == digest:
+                documents[href] = previous
+                continue
+            converter = converter or MarkdownConverter()
+            converter.base_dir = os.path.dirname(output_file) or "."
+            result = render_source(converter, md_file)
+            if result is None:
+                continue
+        documents[href] = search_document(result[0], result[1], digest)
+    return write_search_index(documents, search_dir, store_file, store)
+
+
+def update_search_articles(articles, search_dir, store_file):
+    """Refresh the search entries of a few rebuilt articles.
+    
+    articles are (output_file, title, plain text, source hash) tuples, the
+    text collected while the page was written (see convert_article). The
+    other articles keep their entries from the store, which a full build
+    creates; without a store nothing is written. The rebuilt articles go
+    into the delta index (see write_search_index).
+    """
+    from search import load_search_store, search_entry
+    
+    if not os.path.exists(store_file):
+        print("検索インデックスは一括ビルドで作成されます")
+        return True
+    previous = load_search_store(store_file)
+    documents = dict(previous)
+    for output_file, title, text, digest in articles:
+        documents[index_href(output_file)] = search_entry(title, text, digest)
+    return write_search_index(documents, search_dir, store_file, previous)
+
+
+def search_store_path(manifest_file):
+    """Return the search store kept next to the build manifest"""
+    return os.path.join(os.path.dirname(manifest_file), "search_store.json")
+
+
+def _remove_stale_shards(directory, keep):
+    """Remove the shard files of directory whose names are not in keep"""
+    from search import SHARD_RE
+    
+    if not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        if SHARD_RE.match(name) and name not in keep:
+            os.remove(os.path.join(directory, name))
+
+
+def write_search_index(documents, search_dir, store_file=None, previous=None):
+    """Save the search store and write the index to search_dir.
+    
+    When the index of the previous store is already written, the documents
+    changed since go into its small delta index (search.render_search_
+    delta) and the main shards are left as they are. The whole index is
+    rendered when there is none yet or the delta grows past DELTA_LIMIT.
+    """
+    from search import (DELTA_DIR, DELTA_LIMIT, assign_ids, changed_ids, dump_search_store,
+                        read_search_index, render_search_delta, render_search_index)
+    
+    previous = previous or {}
+    assign_ids(documents, previous)
+    changed = changed_ids(documents, previous)
+    index = None
+    if previous and all("id" in entry for entry in previous.values()):
+        index = read_search_index(search_dir)
+    delta = set()
+    if index is None:
+        files = render_search_index(documents)
+    elif not changed:
+        files = []
+    else:
+        delta = changed | set(index["delta"])
+        if len(delta) > DELTA_LIMIT:
+            delta = set()
+            files = render_search_index(documents)
+        else:
+            files = render_search_delta(documents, delta)
+    
+    if store_file and not save_file(store_file, dump_search_store(documents)):
         return False
+    if not files:
+        return True
+    for name, content in files:
+        if not save_file(os.path.join(search_dir, name), content):
+            return False
     
-    # Extract title and convert content
-    lines = md_content.splitlines()
-    title = lines[0].replace("# ", "") if lines and lines[0].startswith("#") else "Untitled"
+    # Remove the shards of characters no longer indexed, and the whole
+    # delta index once the main shards are rendered again
+    names = {name for name, _ in files}
+    if not delta:
+        _remove_stale_shards(search_dir, names)
+    _remove_stale_shards(os.path.join(search_dir, DELTA_DIR),
+                         {name[len(DELTA_DIR) + 1:] for name in names if name.startswith(f"{DELTA_DIR}/")})
+    if delta:
+        print(f"検索インデックス: {len(documents)} 記事, 差分 {len(delta)} 記事, {len(files) - 1} シャード更新")
+    else:
+        print(f"検索インデックス: {len(documents)} 記事, {len(files) - 1} シャード更新")
+    return True
+
+
+def enable_instrumentation():
+    """Time the build stages from now on (see instrument.py).
     
-    converter = MarkdownConverter()
-    html_content = converter.convert(md_content)
+    The stage functions are wrapped in timers here rather than timed
+    inline, so a build that never calls this pays nothing for them.
+    Converters created before the call are not instrumented. Times are
+    inclusive: a stage called from another is counted in both.
+    """
+    if not instrument.enable():
+        return
     
-    # Get existing date if file exists
-    existing_date = extract_date_from_html(output_file)
+    converter_stages = (
+        ("convert", "convert", instrument.timed),
+        ("iter_convert", "convert", instrument.timed_iter),
+        ("_render_block", "block", instrument.timed),
+        ("_render_inline_text", "inline", instrument.timed),
+    )
+    for name, stage, wrap in converter_stages:
+        setattr(MarkdownConverter, name, wrap(stage, getattr(MarkdownConverter, name)))
+    for name, stage in (("_code_block", "code_block"), ("_paragraph", "paragraph")):
+        setattr(MarkdownConverter, name, staticmethod(instrument.timed(stage, getattr(MarkdownConverter, name))))
     
-    # Generate final HTML
-    full_html = generate_html_template(template_content, title, html_content, existing_date)
+    module_stages = (
+        ("load_file", "read", instrument.timed),
+        ("read_title", "read", instrument.timed),
+        ("generate_html_template", "template", instrument.timed),
+        ("iter_html_template", "template", instrument.timed_iter),
+        ("update_blog_index_entries", "index", instrument.timed),
+        ("save_file", "save", instrument.timed),
+        ("save_file_chunks", "save", instrument.timed),
+    )
+    module = globals()
+    for name, stage, wrap in module_stages:
+        module[name] = wrap(stage, module[name])
+
+
+def main(md_file, template_file, output_file, blog_index_file, manifest_file=None,
+         index_page_size=0, minify=False, search_dir=None):
+    """Main conversion function.
     
-    # Save HTML file
-    if not save_file(output_file, full_html):
+    With a search_dir and a manifest, the article's entry in the search
+    index is refreshed as well.
+    """
+    print(f"Markdownファイルを変換中: {md_file}")
+    
+    template = load_template(template_file)
+    if not template:
+        print("必要なファイルの読み込みに失敗しました")
         return False
     
-    # Update blog index
-    if not update_blog_index(title, output_file, blog_index_file):
+    manifest = load_manifest(manifest_file) if manifest_file else None
+    converter = MarkdownConverter()
+    text_parts = [] if search_dir and manifest is not None else None
+    result = convert_article(converter, md_file, template, output_file,
+                             manifest, template.digest, minify, text_parts)
+    if result is None:
+        print("必要なファイルの読み込みに失敗しました")
+        return False
+    
+    title, changed = result
+    if title is None:
+        print(f"変更なし: {output_file}")
+        return True
+    
+    # Update blog index only when the article content changed
+    if changed and not update_blog_index(title, output_file, blog_index_file, index_page_size):
         print("警告: ブログインデックスの更新に失敗しました")
     
+    if text_parts is not None:
+        digest = manifest[index_href(output_file)]["source_hash"]
+        if not update_search_articles([(output_file, title, "".join(text_parts), digest)],
+                                      search_dir, search_store_path(manifest_file)):
+            print("警告: 検索インデックスの更新に失敗しました")
+    
+    if manifest is not None and not save_manifest(manifest_file, manifest):
+        print("警告: マニフェストの保存に失敗しました")
+    
     print(f"変換完了: {output_file}")
     return True
 
 
-if __name__ == "__main__":
+def fingerprint_template(template, output_dir, docs_dir, manifest_file=None):
+    """Fingerprint the assets under docs_dir and point the template at them.
+    
+    Returns the rewritten template, the hash recorded in the manifest and the
+    asset paths for the converter. The hash covers every fingerprint, so the
+    pages are rebuilt when style.css or an image changes.
+    """
+    from assets import asset_paths, fingerprint_assets, rewrite_asset_urls
+    
+    # The asset manifest records which copies were written, so it is kept
+    # even without a build manifest
+    asset_file = os.path.join(os.path.dirname(manifest_file or ""), "asset_manifest.json")
+    fingerprints = fingerprint_assets(docs_dir or ".", asset_file)
+    paths = asset_paths(docs_dir or ".", fingerprints)
+    template = compile_template(rewrite_asset_urls(template.text, output_dir, paths))
+    template_hash = hash_text(template.digest + json.dumps(fingerprints, sort_keys=True))
+    print(f"フィンガープリント: {len(fingerprints)} 件のアセット")
+    return template, template_hash, paths
+
+
+def build_site(md_dir, template_file, output_dir, blog_index_file, manifest_file=None, jobs=1,
+               index_page_size=0, converter=None, page_budget=0, gzip_output=False,
+               minify=False, search_dir=None, fingerprint=False):
+    """Convert every markdown file in md_dir in a single build.
+    
+    The template is read once and the blog index is written exactly once at
+    the end. With a manifest, unchanged articles are skipped without being
+    converted. With jobs > 1 the markdown conversion fans out over a
+    process pool while template rendering, saving and the index update stay
+    in this process, so the output is identical to a serial build. A
+    long-running caller can pass its own converter to keep it warm. With a
+    page_budget (bytes), a transfer-size report of every page is printed.
+    With gzip_output, changed text files under docs/ get .gz siblings.
+    With minify, article pages are minified while they are rendered.
+    With a search_dir, the full-text search index is written there.
+    With fingerprint, style.css and images get content-hashed copies and
+    article pages refer to those instead.
+    """
+    template = load_template(template_file)
+    if not template:
+        print("必要なファイルの読み込みに失敗しました")
+        return False
+    template_hash = template.digest
+    asset_paths = None
+    if fingerprint:
+        template, template_hash, asset_paths = fingerprint_template(
+            template, output_dir, os.path.dirname(blog_index_file), manifest_file)
+    build_time = time.strftime("%Y年%m月%d日 %H:%M:%S")
+    
+    manifest = load_manifest(manifest_file) if manifest_file else None
+    from pathlib import Path
+    
+    md_files = sorted(Path(md_dir).glob("*.md"))
+    reset_output_stats()
+    ensure_directory(output_dir)
+    print(f"{len(md_files)} 件のMarkdownファイルを確認します")
+    
+    articles = []
+    pending = []
+    skipped = 0
+    failed = 0
+    for md_path in md_files:
+        output_file = os.path.join(output_dir, f"{md_path.stem}.html")
+        checked = check_article(str(md_path), output_file, manifest, template_hash, minify)
+        if checked is None:
+            print(f"エラー: '{md_path}' の変換に失敗しました")
+            failed += 1
+            continue
+        needs_rebuild, state = checked
+        articles.append((str(md_path), output_file, state))
+        if not needs_rebuild:
+            skipped += 1
+            continue
+        pending.append((str(md_path), output_file, state))
+    
+    sources = [md_file for md_file, _, _ in pending]
+    if jobs > 1 and len(sources) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        
+        workers = min(jobs, len(sources))
+        chunksize = max(1, len(sources) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            rendered = list(executor.map(_render_worker, sources, [output_dir] * len(sources),
+                                         [asset_paths] * len(sources), chunksize=chunksize))
+    else:
+        converter = converter or MarkdownConverter()
+        converter.base_dir = output_dir
+        converter.asset_paths = asset_paths
+        rendered = []
+        for md_file in sources:
+            with instrument.article(md_file):
+                rendered.append(render_source(converter, md_file))
+    
+    entries = []
+    rebuilt = 0
+    converted = {}
+    for (md_file, output_file, state), result in zip(pending, rendered):
+        changed = None
+        if result is not None:
+            converted[md_file] = result
+            title, html_content = result
+            with instrument.article(md_file):
+                changed = write_article(title, html_content, template, output_file, state,
+                                        manifest, template_hash, build_time, minify)
+        if changed is None:
+            print(f"エラー: '{md_file}' の変換に失敗しました")
+            failed += 1
+            continue
+        rebuilt += 1
+        if changed:
+            entries.append((title, output_file))
+    
+    # The index is rendered from its store exactly once per build
+    if not update_blog_index_entries(entries, blog_index_file, index_page_size):
+        print("警告: ブログインデックスの更新に失敗しました")
+    
+    if search_dir:
+        store_file = search_store_path(manifest_file) if manifest_file else None
+        if not update_search_index(articles, converted, search_dir, store_file, converter):
+            print("警告: 検索インデックスの更新に失敗しました")
+    
+    if manifest is not None and not save_manifest(manifest_file, manifest):
+        print("警告: マニフェストの保存に失敗しました")
+    
+    print(f"ビルド完了: {rebuilt} 件変換, {skipped} 件スキップ, {failed} 件失敗")
+    print(f"出力: {output_stats['written']} 件書き込み, {output_stats['unchanged']} 件変更なし")
+    
+    if instrument.enabled:
+        instrument.count("articles", len(md_files))
+        instrument.count("converted", rebuilt)
+        instrument.count("skipped", skipped)
+        instrument.count("failed", failed)
+        instrument.count("index_entries_updated", len(entries))
+        instrument.count("files_written", output_stats["written"])
+        instrument.count("files_unchanged", output_stats["unchanged"])
+        if converter is not None:
+            for name, info in (("inline_cache", converter.inline_cache_info()),
+                               ("block_cache", converter.block_cache_info())):
+                instrument.count(f"{name}_hits", info.hits)
+                instrument.count(f"{name}_misses", info.misses)
+    
+    if page_budget:
+        from images import page_weight_report
+        
+        page_weight_report(output_dir, page_budget)
+    
+    if gzip_output:
+        from compress import compress_tree
+        
+        cache_file = None
+        if manifest_file:
+            cache_file = os.path.join(os.path.dirname(manifest_file), "compress_manifest.json")
+        compress_tree(os.path.dirname(blog_index_file) or ".", cache_file)
+    return failed == 0
+
+
+def cli(argv=None):
+    """Parse command line arguments (sys.argv by default) and run a build.
+    
+    Returns whether the conversion succeeded. argparse is only imported
+    here so that callers such as convert.py do not pay for it otherwise.
+    """
     import argparse
     
     parser = argparse.ArgumentParser(
         description="MarkdownをHTMLに変換し、ブログインデックスを更新します"
     )
-    parser.add_argument("--md_file", required=True, help="変換するMarkdownファイル")
+    parser.add_argument("--md_file", help="変換するMarkdownファイル")
+    parser.add_argument("--md_dir", help="一括変換するMarkdownディレクトリ（--output_dirと併用）")
     parser.add_argument("--template_file", required=True, help="HTMLテンプレートファイル")
-    parser.add_argument("--output_file", required=True, help="出力HTMLファイル")
+    parser.add_argument("--output_file", help="出力HTMLファイル")
+    parser.add_argument("--output_dir", help="一括変換時の出力ディレクトリ")
     parser.add_argument("--blog_index_file", required=True, help="blog_index.htmlファイルのパス")
+    parser.add_argument("--manifest_file", help="差分ビルド用マニフェスト（未変更の記事をスキップ）")
+    parser.add_argument("--index_page_size", type=int, default=0,
+                        help="ブログインデックス1ページあたりの記事数（0で分割しない）")
+    parser.add_argument("--page_budget_kb", type=float, default=0,
+                        help="一括変換後、1ページの転送量がこの値（KB）を超える記事を報告")
+    parser.add_argument("--search_dir",
+                        help="全文検索インデックスを出力するディレクトリ（例: ../docs/search）")
+    parser.add_argument("--minify", action="store_true",
+                        help="記事ページのタグ間の空白を除去して出力（<pre>の中身はそのまま）")
+    parser.add_argument("--gzip", action="store_true",
+                        help="一括変換後、docs/以下の変更されたテキストファイルに.gzを作成")
+    parser.add_argument("--fingerprint", action="store_true",
+                        help="一括変換時、style.cssと画像に内容のハッシュを含む名前のコピーを作り記事ページから参照")
+    parser.add_argument("--report",
+                        help="段階ごとの処理時間・カウンタ・遅い記事をJSONのビルドレポートとして保存")
+    parser.add_argument("--report_top", type=int, default=10,
+                        help="ビルドレポートに載せる遅い記事の数")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="一括変換の並列プロセス数（0でCPUコア数）")
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     
-    success = main(args.md_file, args.template_file, args.output_file, args.blog_index_file)
-    exit(0 if success else 1)
\ No newline at end of file
+    if args.report:
+        enable_instrumentation()
+    
+    if args.md_dir:
+        if not args.output_dir:
+            parser.error("--md_dir には --output_dir が必要です")
+        jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+        success = build_site(args.md_dir, args.template_file, args.output_dir,
+                             args.blog_index_file, args.manifest_file, jobs,
+                             args.index_page_size, page_budget=int(args.page_budget_kb * 1024),
+                             gzip_output=args.gzip, minify=args.minify,
+                             search_dir=args.search_dir, fingerprint=args.fingerprint)
+    else:
+        if not args.md_file or not args.output_file:
+            parser.error("--md_file と --output_file を指定してください")
+        success = main(args.md_file, args.template_file, args.output_file,
+                       args.blog_index_file, args.manifest_file, args.index_page_size,
+                       args.minify, args.search_dir)
+    
+    if args.report:
+        instrument.write_report(args.report, args.report_top)
+        print(f"ビルドレポートを保存しました: {args.report}")
+    return success
+
+
+if __name__ == "__main__":
+    exit(0 if cli() else 1)
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Image header reader and page-weight report using only standard library
+Usage: python3 images.py --pages_dir ../docs/blog_html [--budget_kb 1024]
+"""
+import os
+import re
+import struct
+
+
+# JPEG start-of-frame markers (baseline, progressive, lossless, ...)
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7,
+                    0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+# JPEG markers that are not followed by a length field
+JPEG_STANDALONE_MARKERS = {0x01, 0xD8} | set(range(0xD0, 0xD8))
+
+# EXIF orientations that rotate the image by 90 degrees
+EXIF_ROTATED = {5, 6, 7, 8}
+
+_size_cache = {}
+
+
+def _exif_orientation(data):
+    """Return the EXIF orientation stored in an APP1 payload, or None"""
+    if not data.startswith(b"Exif\x00\x00") or len(data) < 14:
+        return None
+    tiff = data[6:]
+    if tiff[:2] == b"II":
+        order = "<"
+    elif tiff[:2] == b"MM":
+        order = ">"
+    else:
+        return None
+    offset = struct.unpack(order + "I", tiff[4:8])[0]
+    if offset + 2 > len(tiff):
+        return None
+    count = struct.unpack(order + "H", tiff[offset:offset + 2])[0]
+    for i in range(count):
+        entry = tiff[offset + 2 + i * 12:offset + 14 + i * 12]
+        if len(entry) < 12:
+            break
+        tag = struct.unpack(order + "H", entry[:2])[0]
+        if tag == 0x0112:
+            return struct.unpack(order + "H", entry[8:10])[0]
+    return None
+
+
+def _jpeg_size(f):
+    """Walk JPEG segments up to the SOF header; returns (width, height)"""
+    orientation = None
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        while byte and byte != b"\xff":
+            byte = f.read(1)
+        while byte == b"\xff":
+            byte = f.read(1)
+        if not byte:
+            return None
+        marker = byte[0]
+        if marker in JPEG_STANDALONE_MARKERS:
+            continue
+        if marker == 0xD9:
+            return None
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return None
+        length = struct.unpack(">H", length_bytes)[0]
+        if marker in JPEG_SOF_MARKERS:
+            header = f.read(5)
+            if len(header) < 5:
+                return None
+            height, width = struct.unpack(">HH", header[1:5])
+            if orientation in EXIF_ROTATED:
+                width, height = height, width
+            return width, height
+        if marker == 0xE1 and orientation is None:
+            orientation = _exif_orientation(f.read(length - 2))
+        else:
+            f.seek(length - 2, os.SEEK_CUR)
+
+
+def read_image_size(path):
+    """Read (width, height) from a JPEG, PNG or GIF header, or None"""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(26)
+            if head.startswith(b"\x89PNG\r\n\x1a\n") and head[12:16] == b"IHDR":
+                return struct.unpack(">II", head[16:24])
+            if head[:6] in (b"GIF87a", b"GIF89a"):
+                return struct.unpack("<HH", head[6:10])
+            if head.startswith(b"\xff\xd8"):
+                return _jpeg_size(f)
+    except (OSError, struct.error):
+        return None
+    return None
+
+
+def image_size(path):
+    """Return the cached (width, height) of an image, re-read when it changes"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _size_cache.get(path)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    size = read_image_size(path)
+    _size_cache[path] = (stamp, size)
+    return size
+
+
+# Local resources a page makes the browser download
+RESOURCE_RE = re.compile(r'<(?:img|script)\b[^>]*?\bsrc="([^"]+)"|<link\b[^>]*?\bhref="([^"]+)"')
+
+
+def is_local_url(url):
+    """Return whether url is a path relative to its page, to a file of this site.
+    
+    Root-relative URLs (/image/x.jpg) depend on where the site is served
+    from, so they are not resolved on disk and count as non-local.
+    """
+    return not re.match(r'^(?:[a-z][a-z0-9+.-]*:|/|#)', url, re.IGNORECASE)
+
+
+def page_weight(page_path):
+    """Return (total bytes, [(resource path, bytes)]) transferred for a page"""
+    with open(page_path, "r", encoding="utf-8") as f:
+        content = f.read()
+    total = len(content.encode("utf-8"))
+    resources = []
+    seen = set()
+    base = os.path.dirname(page_path)
+    for match in RESOURCE_RE.finditer(content):
+        url = (match.group(1) or match.group(2)).split("#")[0].split("?")[0]
+        if not url or not is_local_url(url) or url in seen:
+            continue
+        seen.add(url)
+        path = os.path.normpath(os.path.join(base, url))
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            continue
+        resources.append((path, size))
+        total += size
+    return total, resources
+
+
+def page_weight_report(pages_dir, budget_bytes):
+    """Print the transfer size of every page; returns the pages over budget"""
+    rows = []
+    for name in sorted(os.listdir(pages_dir)):
+        if name.endswith(".html"):
+            path = os.path.join(pages_dir, name)
+            total, resources = page_weight(path)
+            rows.append((total, name, resources))
+    rows.sort(reverse=True)
+    
+    over = []
+    print(f"ページ転送量（予算 {budget_bytes / 1024:.0f} KB）:")
+    for total, name, resources in rows:
+        flag = ""
+        if total > budget_bytes:
+            flag = "  <-- 予算超過"
+            over.append(name)
+        print(f"  {total / 1024:9.1f} KB  {name}{flag}")
+        if flag:
+            for path, size in sorted(resources, key=lambda item: item[1], reverse=True)[:3]:
+                print(f"      {size / 1024:9.1f} KB  {os.path.basename(path)}")
+    if over:
+        print(f"警告: {len(over)} ページが予算を超えています")
+    return over
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        description="記事ページの転送量を集計し、予算を超えるページを表示します"
+    )
+    parser.add_argument("--pages_dir", default="../docs/blog_html", help="記事HTMLのディレクトリ")
+    parser.add_argument("--budget_kb", type=float, default=1024, help="1ページあたりの転送量の予算（KB）")
+    
+    args = parser.parse_args()
+    over = page_weight_report(args.pages_dir, args.budget_kb * 1024)
+    exit(1 if over else 0)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Build instrumentation: stage timers, counters and a JSON build report
+
+Nothing here runs unless enable() is called. The stages are timed by
+wrapping their functions at that point (convert_md_to_html.enable_
+instrumentation), so a build without a report pays nothing.
+"""
+import contextlib
+import json
+import time
+from functools import wraps
+
+
+enabled = False
+# {stage: [calls, seconds]}
+stages = {}
+# {name: value}
+counters = {}
+# {article: {stage: seconds}}
+files = {}
+_current_file = None
+_started = None
+
+
+def enable():
+    """Start collecting; returns False if it was already enabled"""
+    global enabled, _started
+    if enabled:
+        return False
+    enabled = True
+    _started = time.perf_counter()
+    return True
+
+
+def _record(stage, elapsed):
+    entry = stages.get(stage)
+    if entry is None:
+        entry = stages[stage] = [0, 0.0]
+    entry[0] += 1
+    entry[1] += elapsed
+    if _current_file is not None:
+        per_file = files[_current_file]
+        per_file[stage] = per_file.get(stage, 0.0) + elapsed
+
+
+class Timer:
+    """Context manager adding its elapsed time to a stage"""
+    
+    __slots__ = ("stage", "start")
+    
+    def __init__(self, stage):
+        self.stage = stage
+        self.start = 0.0
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc):
+        _record(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+_null = contextlib.nullcontext()
+
+
+def count(name, value=1):
+    """Add value to a counter"""
+    if enabled:
+        counters[name] = counters.get(name, 0) + value
+
+
+@contextlib.contextmanager
+def _article(name):
+    global _current_file
+    previous = _current_file
+    _current_file = name
+    per_file = files.setdefault(name, {})
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        per_file["total"] = per_file.get("total", 0.0) + time.perf_counter() - start
+        _current_file = previous
+
+
+def article(name):
+    """Attribute the stages timed inside the block to one article"""
+    return _article(name) if enabled else _null
+
+
+def timed(stage, func):
+    """Wrap func so each call is timed as stage"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with Timer(stage):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def timed_iter(stage, func):
+    """Wrap a generator function so the time spent producing its items is
+    timed as stage and counted as one call (time spent by the consumer is
+    not counted)"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        elapsed = 0.0
+        start = time.perf_counter()
+        try:
+            iterator = iter(func(*args, **kwargs))
+            while True:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                elapsed += time.perf_counter() - start
+                start = None
+                yield item
+                start = time.perf_counter()
+        finally:
+            if start is not None:
+                elapsed += time.perf_counter() - start
+            _record(stage, elapsed)
+    return wrapper
+
+
+def report(top=10):
+    """Return the collected numbers as a JSON-serialisable dict"""
+    def rounded(entry):
+        return {stage: round(seconds, 6) for stage, seconds in entry.items()}
+    
+    slowest = sorted(files.items(), key=lambda item: item[1].get("total", 0.0), reverse=True)
+    return {
+        "total_seconds": round(time.perf_counter() - _started, 6) if _started else 0.0,
+        "stages": {
+            stage: {"calls": calls, "seconds": round(seconds, 6)}
+            for stage, (calls, seconds) in sorted(stages.items(), key=lambda item: -item[1][1])
+        },
+        "counters": dict(sorted(counters.items())),
+        "slowest": [{"article": name, **rounded(entry)} for name, entry in slowest[:top]],
+        "files": {name: rounded(entry) for name, entry in sorted(files.items())},
+    }
+
+
+def write_report(path, top=10):
+    """Write the build report to path as JSON"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report(top), f, ensure_ascii=False, indent=2)
+        f.write("\n")
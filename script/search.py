@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Full-text search index for client-side search (docs/search/)
+Usage: python3 search.py --query 検索語 [--search_dir ../docs/search]
+"""
+import html
+import json
+import os
+import re
+import unicodedata
+
+
+# Postings are sharded by the code point of a term's first character, so
+# the browser only fetches the shards of the characters in its query.
+SHARD_BITS = 6
+SHARD_RE = re.compile(r'^[0-9a-f]{4,}\.json$')
+DOCUMENTS_FILE = "documents.json"
+# Articles indexed again since the whole index was last rendered go into
+# the small delta index under DELTA_DIR; past DELTA_LIMIT of them the
+# whole index is rendered again.
+DELTA_DIR = "delta"
+DELTA_LIMIT = 32
+
+TAG_RE = re.compile(r'<[^>]*>')
+# Same character classes as search.js: letters, digits and underscore
+WORD_RE = re.compile(r'\w+')
+
+
+def html_text(html_content):
+    """Return the plain text of converted article HTML"""
+    return html.unescape(TAG_RE.sub(" ", html_content))
+
+
+def normalize(text):
+    """Fold full/half width and case the same way the browser does"""
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+def iter_ngrams(text):
+    """Yield (term, position) character bigrams of normalized text.
+
+    Every word also yields its last character as a unigram, so that a
+    one-character query matches it wherever it appears.
+    """
+    for match in WORD_RE.finditer(text):
+        word = match.group()
+        start = match.start()
+        for i in range(len(word) - 1):
+            yield word[i:i + 2], start + i
+        yield word[-1], match.end() - 1
+
+
+def shard_key(term):
+    """Return the shard a term is stored in (e.g. '0138' for 'ガ')"""
+    return f"{ord(term[0]) >> SHARD_BITS:04x}"
+
+
+def search_entry(title, text, source_hash=None):
+    """Return the search store entry of an article's plain text"""
+    return {
+        "title": title,
+        "text": normalize(f"{title}\n{text}"),
+        "source_hash": source_hash,
+    }
+
+
+def search_document(title, html_content, source_hash=None):
+    """Return the search store entry of one converted article"""
+    return search_entry(title, html_text(html_content), source_hash)
+
+
+def load_search_store(store_file):
+    """Load {href: entry}; a missing or broken store is empty"""
+    if not store_file or not os.path.exists(store_file):
+        return {}
+    try:
+        with open(store_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data.get("documents", {}) if isinstance(data, dict) else {}
+
+
+def dump_search_store(documents):
+    """Serialize the search store with a stable key order"""
+    return json.dumps({"documents": documents}, ensure_ascii=False, indent=2, sort_keys=True) + "\n"
+
+
+def assign_ids(documents, previous):
+    """Give every document a stable id: the one it had in the previous
+    store, or the next unused one. Ids of removed documents are not reused,
+    so the postings of the other documents never change."""
+    used = [entry["id"] for entry in previous.values() if "id" in entry]
+    next_id = max(used, default=-1) + 1
+    for href in sorted(documents):
+        entry = documents[href]
+        old = previous.get(href)
+        if old and "id" in old:
+            entry["id"] = old["id"]
+        else:
+            entry["id"] = next_id
+            next_id += 1
+
+
+def document_postings(doc_id, text):
+    """Return {term: [doc id, first position, gaps...]} of one document"""
+    positions = {}
+    for term, position in iter_ngrams(text):
+        positions.setdefault(term, []).append(position)
+    postings = {}
+    for term, found in positions.items():
+        deltas = [doc_id, found[0]]
+        deltas.extend(b - a for a, b in zip(found, found[1:]))
+        postings[term] = deltas
+    return postings
+
+
+def _dump(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+
+
+def _documents_file(documents, delta=(), delta_shards=()):
+    """documents.json: [href, title] by document id (null for removed ids)
+    and the ids and shard keys of the delta index"""
+    listed = [None] * (max((entry["id"] for entry in documents.values()), default=-1) + 1)
+    for href, entry in documents.items():
+        listed[entry["id"]] = [href, entry["title"]]
+    return DOCUMENTS_FILE, _dump({
+        "documents": listed,
+        "delta": sorted(delta),
+        "delta_shards": sorted(delta_shards),
+    })
+
+
+def _render_shards(entries):
+    """Return {shard key: {term: postings}} of entries in id order"""
+    shards = {}
+    for entry in sorted(entries, key=lambda entry: entry["id"]):
+        for term, deltas in document_postings(entry["id"], entry["text"]).items():
+            shards.setdefault(shard_key(term), {}).setdefault(term, []).append(deltas)
+    return shards
+
+
+def render_search_index(documents):
+    """Build the inverted index; returns [(file name, json)].
+
+    documents carry the ids given by assign_ids. documents.json lists
+    [href, title] by document id. Each shard maps a term to its postings,
+    one [doc id, first position, gaps...] list per document in id order,
+    with positions delta-encoded to keep the shards small.
+    """
+    shards = _render_shards(documents.values())
+    files = [_documents_file(documents)]
+    files.extend((f"{key}.json", _dump(shard)) for key, shard in sorted(shards.items()))
+    return files
+
+
+def changed_ids(documents, previous):
+    """Return the ids of the documents added, changed or removed since previous"""
+    changed = {
+        entry["id"] for href, entry in documents.items()
+        if href not in previous or previous[href]["text"] != entry["text"]
+        or previous[href]["title"] != entry["title"]
+    }
+    changed.update(previous[href]["id"] for href in previous.keys() - documents.keys())
+    return changed
+
+
+def render_search_delta(documents, delta):
+    """Build the delta index of the documents whose ids are in delta.
+
+    Rewriting the main shards for one article touches most of them, since
+    every shard holds the postings of all articles. Instead the postings
+    of the main shards are ignored for the delta ids, and the current
+    documents with those ids are indexed again in small shards under
+    delta/. Ids of removed documents stay in delta without postings.
+    Returns [(file name, json)] like render_search_index.
+    """
+    shards = _render_shards(entry for entry in documents.values() if entry["id"] in delta)
+    files = [_documents_file(documents, delta, shards)]
+    files.extend((f"{DELTA_DIR}/{key}.json", _dump(shard)) for key, shard in sorted(shards.items()))
+    return files
+
+
+def read_search_index(search_dir):
+    """Return the written documents.json as a dict, or None"""
+    try:
+        with open(os.path.join(search_dir, DOCUMENTS_FILE), "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return index if isinstance(index, dict) else None
+
+
+def indexed_hrefs(search_dir):
+    """Return the hrefs listed in a written documents.json, or None"""
+    index = read_search_index(search_dir)
+    if index is None:
+        return None
+    return {document[0] for document in index["documents"] if document}
+
+
+def search(search_dir, query):
+    """Look a query up in a written index; returns [(href, title)].
+
+    Mirrors search.js: every word of the query must appear as a phrase.
+    """
+    index = read_search_index(search_dir) or {"documents": [], "delta": [], "delta_shards": []}
+    documents = index["documents"]
+    delta = set(index["delta"])
+    delta_shards = set(index["delta_shards"])
+    shards = {}
+
+    def load_json(name):
+        if name not in shards:
+            try:
+                with open(os.path.join(search_dir, f"{name}.json"), "r", encoding="utf-8") as f:
+                    shards[name] = json.load(f)
+            except OSError:
+                shards[name] = {}
+        return shards[name]
+
+    def postings(term):
+        # Main postings of documents indexed again in the delta are stale
+        key = shard_key(term)
+        found = [entry for entry in load_json(key).get(term, []) if entry[0] not in delta]
+        if key in delta_shards:
+            found.extend(load_json(f"{DELTA_DIR}/{key}").get(term, []))
+        return found
+
+    def terms(key):
+        found = set(load_json(key))
+        if key in delta_shards:
+            found.update(load_json(f"{DELTA_DIR}/{key}"))
+        return found
+
+    def positions(term):
+        found = {}
+        for entry in postings(term):
+            position = entry[1]
+            found[entry[0]] = {position}
+            for gap in entry[2:]:
+                position += gap
+                found[entry[0]].add(position)
+        return found
+
+    matched = None
+    for word in WORD_RE.findall(normalize(query)):
+        if len(word) == 1:
+            docs = set()
+            for term in terms(shard_key(word)):
+                if term.startswith(word):
+                    docs.update(entry[0] for entry in postings(term))
+        else:
+            # Phrase match: bigram i must start i characters after bigram 0
+            starts = positions(word[:2])
+            for i in range(1, len(word) - 1):
+                following = positions(word[i:i + 2])
+                starts = {
+                    doc: {p for p in found if p + i in following.get(doc, ())}
+                    for doc, found in starts.items()
+                }
+            docs = {doc for doc, found in starts.items() if found}
+        matched = docs if matched is None else matched & docs
+    return [tuple(documents[doc]) for doc in sorted(matched or ())]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="生成済みの全文検索インデックスで記事を検索します"
+    )
+    parser.add_argument("--query", required=True, help="検索語（空白区切りですべてを含む記事）")
+    parser.add_argument("--search_dir", default="../docs/search", help="検索インデックスのディレクトリ")
+
+    args = parser.parse_args()
+    for href, title in search(args.search_dir, args.query):
+        print(f"{title}: {href}")
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Development server with live incremental rebuild
+Usage: python3 serve.py [--watch] [--port 8000] [--interval 0.5]
+"""
+import os
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from convert_md_to_html import (
+    MarkdownConverter,
+    build_site,
+    convert_article,
+    index_href,
+    load_index_store,
+    load_manifest,
+    load_template,
+    save_manifest,
+    search_store_path,
+    update_blog_index_entries,
+    update_search_articles,
+    write_blog_index,
+)
+
+
+# Polled by the page script; the body changes after every rebuild
+RELOAD_PATH = "/__reload"
+RELOAD_SCRIPT = (
+    "<script>(function(){var v=null;setInterval(function(){"
+    f"fetch('{RELOAD_PATH}').then(function(r){{return r.text()}}).then(function(t){{"
+    "if(v!==null&&t!==v)location.reload();v=t}).catch(function(){})},1000)})();</script>"
+)
+
+
+def snapshot(directory, pattern):
+    """Return {path: (mtime_ns, size)} for the files matching pattern"""
+    state = {}
+    for path in Path(directory).glob(pattern):
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        state[str(path)] = (st.st_mtime_ns, st.st_size)
+    return state
+
+
+def changed_paths(old, new):
+    """Return the paths that were added or modified between two snapshots"""
+    return sorted(path for path, stamp in new.items() if old.get(path) != stamp)
+
+
+class SiteBuilder:
+    """Keeps one converter warm and rebuilds only the affected pages"""
+    
+    def __init__(self, md_dir, template_file, output_dir, blog_index_file,
+                 manifest_file, index_page_size=0, search_dir=None):
+        self.md_dir = md_dir
+        self.template_file = template_file
+        self.output_dir = output_dir
+        self.blog_index_file = blog_index_file
+        self.manifest_file = manifest_file
+        self.index_page_size = index_page_size
+        self.search_dir = search_dir
+        self.converter = MarkdownConverter(cache=True)
+        # Bumped after every rebuild so open pages know to reload
+        self.version = 0
+    
+    def build_all(self):
+        """Incrementally rebuild the whole site"""
+        success = build_site(self.md_dir, self.template_file, self.output_dir,
+                             self.blog_index_file, self.manifest_file,
+                             index_page_size=self.index_page_size, converter=self.converter,
+                             search_dir=self.search_dir)
+        self.version += 1
+        return success
+    
+    def rebuild_articles(self, md_files):
+        """Rebuild the given markdown files and update the index once"""
+        template = load_template(self.template_file)
+        if not template:
+            return False
+        manifest = load_manifest(self.manifest_file)
+        entries = []
+        rebuilt = []
+        for md_file in md_files:
+            output_file = os.path.join(self.output_dir, f"{Path(md_file).stem}.html")
+            text_parts = [] if self.search_dir else None
+            result = convert_article(self.converter, md_file, template, output_file,
+                                     manifest, template.digest, text_parts=text_parts)
+            if result is None:
+                print(f"エラー: '{md_file}' の変換に失敗しました")
+                continue
+            title, changed = result
+            if changed:
+                entries.append((title, output_file))
+            if title is not None and text_parts is not None:
+                rebuilt.append((output_file, title, "".join(text_parts),
+                                manifest[index_href(output_file)]["source_hash"]))
+        if entries and not update_blog_index_entries(entries, self.blog_index_file,
+                                                     self.index_page_size):
+            print("警告: ブログインデックスの更新に失敗しました")
+        if rebuilt and not update_search_articles(rebuilt, self.search_dir,
+                                                  search_store_path(self.manifest_file)):
+            print("警告: 検索インデックスの更新に失敗しました")
+        save_manifest(self.manifest_file, manifest)
+        self.version += 1
+        return True
+    
+    def rebuild_index(self):
+        """Render the blog index again from its store"""
+        store = load_index_store(self.blog_index_file)
+        if store is None:
+            return False
+        write_blog_index(store, self.blog_index_file, self.index_page_size)
+        self.version += 1
+        return True
+
+
+class DevRequestHandler(SimpleHTTPRequestHandler):
+    """Serves docs/ and injects the auto-reload script into HTML pages"""
+    
+    site = None
+    
+    def do_GET(self):
+        if self.path == RELOAD_PATH:
+            body = str(self.site.version).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Cache-Control", "no-store")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            path = os.path.join(path, "index.html")
+        if path.endswith(".html") and os.path.isfile(path):
+            with open(path, "rb") as f:
+                body = f.read()
+            script = RELOAD_SCRIPT.encode("utf-8")
+            if b"</body>" in body:
+                body = body.replace(b"</body>", script + b"</body>", 1)
+            else:
+                body += script
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Cache-Control", "no-store")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        super().do_GET()
+    
+    def log_message(self, format, *args):
+        # Keep the reload polling out of the console
+        if RELOAD_PATH not in self.path:
+            super().log_message(format, *args)
+
+
+def watch(site, interval):
+    """Poll blog_md/ and template/ and rebuild whatever changed"""
+    template_dir = os.path.dirname(site.template_file) or "."
+    sources = snapshot(site.md_dir, "*.md")
+    templates = snapshot(template_dir, "*.html")
+    while True:
+        time.sleep(interval)
+        new_sources = snapshot(site.md_dir, "*.md")
+        new_templates = snapshot(template_dir, "*.html")
+        changed_templates = changed_paths(templates, new_templates)
+        changed_sources = changed_paths(sources, new_sources)
+        sources, templates = new_sources, new_templates
+        if not changed_templates and not changed_sources:
+            continue
+        
+        start = time.perf_counter()
+        if any(os.path.samefile(path, site.template_file) for path in changed_templates):
+            # The article template changed: every page has to be rendered again
+            site.build_all()
+        else:
+            if changed_sources:
+                site.rebuild_articles(changed_sources)
+            if changed_templates:
+                site.rebuild_index()
+        elapsed = (time.perf_counter() - start) * 1000
+        blocks = site.converter.block_cache_info()
+        inline = site.converter.inline_cache_info()
+        print(f"再ビルド完了 ({elapsed:.1f} ms, ブロックキャッシュ {blocks.hits} ヒット / {blocks.misses} ミス, "
+              f"インラインキャッシュ {inline.hits} ヒット / {inline.misses} ミス): "
+              f"{', '.join(changed_templates + changed_sources)}")
+
+
+def main(md_dir, template_file, docs_dir, manifest_file, port=8000, watch_files=False,
+         interval=0.5, index_page_size=0):
+    """Build the site once, then serve docs/ (and rebuild on change)"""
+    output_dir = os.path.join(docs_dir, "blog_html")
+    blog_index_file = os.path.join(docs_dir, "blog_index.html")
+    site = SiteBuilder(md_dir, template_file, output_dir, blog_index_file,
+                       manifest_file, index_page_size, os.path.join(docs_dir, "search"))
+    site.build_all()
+    
+    DevRequestHandler.site = site
+    handler = partial(DevRequestHandler, directory=docs_dir)
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    print(f"http://127.0.0.1:{port}/blog_index.html で配信中 (Ctrl+Cで終了)")
+    
+    try:
+        if watch_files:
+            print(f"{md_dir} と {os.path.dirname(template_file)} を監視しています")
+            watch(site, interval)
+        else:
+            thread.join()
+    except KeyboardInterrupt:
+        print("\n終了します")
+    finally:
+        server.shutdown()
+        server.server_close()
+    return True
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        description="docs/を配信し、変更された記事を自動で再ビルドします"
+    )
+    parser.add_argument("--md_dir", default="../blog_md", help="Markdownディレクトリ")
+    parser.add_argument("--template_file", default="template/template.html", help="HTMLテンプレートファイル")
+    parser.add_argument("--docs_dir", default="../docs", help="配信するディレクトリ")
+    parser.add_argument("--manifest_file", default="build_manifest.json", help="差分ビルド用マニフェスト")
+    parser.add_argument("--port", type=int, default=8000, help="待ち受けポート")
+    parser.add_argument("--watch", action="store_true", help="変更を監視して自動で再ビルド")
+    parser.add_argument("--interval", type=float, default=0.5, help="監視のポーリング間隔（秒）")
+    
+    args = parser.parse_args()
+    
+    main(args.md_dir, args.template_file, args.docs_dir, args.manifest_file,
+         args.port, args.watch, args.interval)